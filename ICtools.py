@@ -1,9 +1,17 @@
 import numpy as np
-from skimage import transform
-import tifffile as tfl
+import ctypes as C
+import hashlib
+import json
+import threading
 import time
 import os
-import u6
+import queue
+import tisgrabber as ic
+import camprops
+import ljsync
+
+# tifffile and u6 are imported in the functions that use them, so importing
+# ICtools stays fast for scripts that never touch the camera or the disk.
 
 
 def _set_and_check(camFn, *pv):
@@ -24,6 +32,12 @@ def _set_and_check(camFn, *pv):
         raise RuntimeError('Error calling into API: %s, retval %d' % (str(camFn), retval))
 
 
+# our camera and its defaults, see setCameraDefaults
+DEFAULT_DEVICE = 'DMK 72BUC02 7610448'
+DEFAULT_VIDEO_FORMAT = 'Y800 (640x480)'
+DEFAULT_FRAME_RATE = 15.0
+
+
 def setCameraDefaults(cam):
     """
 
@@ -34,91 +48,1087 @@ def setCameraDefaults(cam):
         nothing.
 
     """
-    _set_and_check(cam.open, 'DMK 72BUC02 7610448')
-    _set_and_check(cam.SetVideoFormat, 'Y800 (640x480)')
-    _set_and_check(cam.SetFrameRate, 15.0)
+    _set_and_check(cam.open, DEFAULT_DEVICE)
+    camprops.propertyCache(cam).invalidate()  # a newly opened device, whatever we set before
+    _set_and_check(cam.SetVideoFormat, DEFAULT_VIDEO_FORMAT)
+    _set_and_check(cam.SetFrameRate, DEFAULT_FRAME_RATE)
 
     print('Camera properties set successfully.')
 
 
-def setCameraParams(cam, params):
+def setCameraParams(cam, params, force=False, returnReport=False):
     """ Set imaging parameters.
 
+    Only settings that differ from the camera's last known state are written
+    (see camprops.PropertyCache), so re-applying the same params is free.
+
     Args:
         cam: (TIC_CAM) instantiated camera object
-        params: (dict) camera parameters
+        params: (dict) camera parameters, see camprops.PARAM_SCHEMA
+        force: (bool) write every setting, e.g. if the camera was changed from
+            IC Capture or the property dialog
+        returnReport: (bool) return the per-call timing report
 
     Returns:
-        nothing.
+        report: (dict) only if returnReport, see camprops.PropertyCache.apply.
+        raises ValueError if params don't match the schema, RuntimeError if a
+        setting is refused.
+    """
+    report = camprops.propertyCache(cam).apply(params, force)
+
+    print('Parameters set successfully ({} written, {} unchanged, {:.3f} s).'.format(
+        len(report['written']), report['skipped'], report['time']))
+    if returnReport:
+        return report
+
+
+def _profileKey(params):
+    """ Hash of everything a profile's device state depends on. """
+    desc = {'device': DEFAULT_DEVICE, 'videoFormat': DEFAULT_VIDEO_FORMAT,
+            'frameRate': DEFAULT_FRAME_RATE, 'params': params}
+    return hashlib.sha1(json.dumps(desc, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def setCameraProfile(cam, name, params, profileDir):
+    """ Bring the camera up with our defaults and params, from a saved profile if possible.
+
+    A profile is the driver's device state file (<name>.xml: device, video format,
+    frame rate and all properties) plus <name>.json with a hash of the defaults and
+    params it was saved with. If the hash matches, the device opens as
+    DEFAULT_DEVICE and the file loads cleanly, the camera is up after a single
+    LoadDeviceStateFromFileEx call. Otherwise it is set up property by property
+    with setCameraDefaults and setCameraParams, and the profile is saved again.
+
+    Args:
+        cam: (TIS_CAM) camera object, not yet opened
+        name: (str) profile name, e.g. 'pupil-15fps'
+        params: (dict) camera parameters, see setCameraParams
+        profileDir: (str) directory holding the profiles
 
+    Returns:
+        loaded: (bool) True if the profile was loaded, False if it was (re)built.
     """
-    # honestly ugh
+    stateFile = os.path.join(profileDir, name + '.xml')
+    metaFile = os.path.join(profileDir, name + '.json')
+    key = _profileKey(params)
+    camprops.paramSettings(params)  # check params before touching the camera
 
-    _set_and_check(cam.SetPropertyValue, 'Brightness', 'Value', params['brightness'])
-    _set_and_check(cam.SetPropertyValue, 'Contrast', 'Value', params['contrast'])
+    try:
+        with open(metaFile) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get('key') == key and os.path.exists(stateFile):
+        retval = cam.LoadDeviceStateFromFileEx(stateFile, 1)
+        if retval == 1 and cam.GetUniqueName() == DEFAULT_DEVICE:
+            camprops.propertyCache(cam).assume(params)
+            print('Loaded camera profile {}.'.format(name))
+            return True
+        print('Could not load camera profile {} (retval {}), setting up from params.'.format(name, retval))
+    elif meta:
+        print('Camera profile {} is out of date, setting up from params.'.format(name))
 
-    if params['gain'] == 'auto':
-        _set_and_check(cam.SetPropertySwitch, 'Gain', 'Auto', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Gain', 'Auto', 0)
-        _set_and_check(cam.SetPropertyValue, 'Gain', 'Value', params['gain'])
+    setCameraDefaults(cam)
+    setCameraParams(cam, params, force=True)
+    os.makedirs(profileDir, exist_ok=True)
+    _set_and_check(cam.SaveDeviceStateToFile, stateFile)
+    with open(metaFile, 'w') as f:
+        json.dump({'key': key, 'device': DEFAULT_DEVICE, 'params': params,
+                   'saved': time.strftime('%Y-%m-%d %H:%M:%S')}, f, indent=1, default=str)
+    print('Saved camera profile {}.'.format(name))
+    return False
 
-    if params['exposure'] == 'auto':
-        _set_and_check(cam.SetPropertySwitch, 'Exposure', 'Auto', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Exposure', 'Auto', 0)
-        _set_and_check(cam.SetPropertyAbsoluteValue, 'Exposure', 'Value', params['exposure'])
 
-    _set_and_check(cam.SetPropertyValue, 'Exposure', 'Auto Reference', params['exposureAutoRef'])
+class FrameRing(object):
+    """ Preallocated ring buffer of camera frames.
 
-    if params['exposureAutoMax'] == 'auto':
-        raise ValueError('Trouble setting auto right now. Use a float value.')
-        # hypothesis: both auto exposure and exposure auto max auto are ID'd "Auto", which causes problems.
-        # _set_and_check(cam.SetPropertySwitch, 'Auto Max Value Auto', 'Enable', 1)
-    else:
-        _set_and_check(cam.SetPropertyAbsoluteValue, 'Exposure', 'Auto Max Value', params['exposureAutoMax'])
+    Filled from the driver's frame-ready callback (one producer) and drained by
+    the acquisition loop (one consumer). If the consumer falls more than nSlots
+    frames behind, the oldest unread frames are overwritten and counted in
+    `overruns`.
 
-    if params['highlightReduction']:
-        _set_and_check(cam.SetPropertySwitch, 'Highlight reduction', 'Enable', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Highlight reduction', 'Enable', 0)
+    The driver numbers frames consecutively, so push() also checks each frame
+    number against the last one: numbers that never arrive are listed in
+    `dropped` (frames the driver lost) and numbers that arrive again or out of
+    order in `duplicates`.
+    """
 
-    _set_and_check(cam.SetPropertyValue, 'Sharpness', 'Value', params['sharpness'])
-    _set_and_check(cam.SetPropertyValue, 'Sharpness', 'Value', params['sharpness'])
-    _set_and_check(cam.SetPropertyValue, 'Gamma', 'Value', params['gamma'])
-    _set_and_check(cam.SetPropertyValue, 'Denoise', 'Value', params['denoise'])
+    def __init__(self, nSlots, frameShape, dtype=np.uint8):
+        self.nSlots = nSlots
+        self.frames = np.zeros((nSlots,) + tuple(frameShape), dtype=dtype)
+        self.frameNums = np.full(nSlots, -1, dtype=np.int64)
+        self.arrivalNs = np.zeros(nSlots, dtype=np.int64)
+        self.nWritten = 0
+        self.nRead = 0
+        self.overruns = 0
+        self.lastFrameNum = None
+        self.dropped = []
+        self.duplicates = []
+        self._skipBelow = -1  # frames numbered below this are stale, see reset
+        self._cond = threading.Condition()
 
-    if params['autoCenter']:
-        _set_and_check(cam.SetPropertySwitch, 'Partial scan', 'Auto-center', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Partial scan', 'Auto-center', 0)
-        _set_and_check(cam.SetPropertyValue, 'Partial scan', 'X Offset', params['xOffset'])
-        _set_and_check(cam.SetPropertyValue, 'Partial scan', 'Y Offset', params['yOffset'])
+    def push(self, pBuffer, frameNum):
+        """ Copy one frame from a driver buffer into the next slot.
 
-    if params['trigger']:
-        _set_and_check(cam.SetPropertySwitch, 'Trigger', 'Enable', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Trigger', 'Enable', 0)
+        Args:
+            pBuffer: (ctypes pointer) start of the driver's image buffer
+            frameNum: (int) frame number passed by the driver
+        """
+        arrivalNs = time.perf_counter_ns()
+        with self._cond:
+            if self.lastFrameNum is None or frameNum == self.lastFrameNum + 1:
+                self.lastFrameNum = frameNum
+            elif frameNum > self.lastFrameNum:
+                self.dropped.extend(range(max(self.lastFrameNum + 1, self._skipBelow), frameNum))
+                self.lastFrameNum = frameNum
+            else:
+                self.duplicates.append(frameNum)
+            iSlot = self.nWritten % self.nSlots
+            slot = self.frames[iSlot]
+            C.memmove(slot.ctypes.data, pBuffer, slot.nbytes)
+            self.frameNums[iSlot] = frameNum
+            self.arrivalNs[iSlot] = arrivalNs
+            self.nWritten += 1
+            self._cond.notify()
 
-    if params['strobe']:
-        _set_and_check(cam.SetPropertySwitch, 'Strobe', 'Enable', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Strobe', 'Enable', 0)
+    def pop(self, out, timeout=2.0):
+        """ Copy the oldest unread frame into out.
 
-    if params['strobePolarity']:
-        _set_and_check(cam.SetPropertySwitch, 'Strobe', 'Polarity', 1)
-    else:
-        _set_and_check(cam.SetPropertySwitch, 'Strobe', 'Polarity', 0)
+        Args:
+            out: (np.ndarray) destination, same shape and dtype as one slot
+            timeout: (float) seconds to wait for a frame
+
+        Returns:
+            frameNum: (int) driver frame number of the copied frame
+            arrivalNs: (int) perf_counter_ns when the driver delivered it.
+            raises RuntimeError if no frame arrives within timeout.
+        """
+        with self._cond:
+            while True:
+                if not self._cond.wait_for(lambda: self.nRead < self.nWritten, timeout):
+                    raise RuntimeError('No frame from camera within %.1f s' % timeout)
+                nBehind = self.nWritten - self.nRead
+                if nBehind > self.nSlots:
+                    self.overruns += nBehind - self.nSlots
+                    self.nRead = self.nWritten - self.nSlots
+                iSlot = self.nRead % self.nSlots
+                self.nRead += 1
+                if self.frameNums[iSlot] >= self._skipBelow:
+                    break
+            out[...] = self.frames[iSlot]
+            return int(self.frameNums[iSlot]), int(self.arrivalNs[iSlot])
+
+    def reset(self, nextFrameNum=None):
+        """ Discard unread frames and clear the drop bookkeeping, e.g. between trials
+        while the camera stays live.
 
-    if params['toneMapping']:
-        _set_and_check(cam.SetPropertySwitch, 'Tone Mapping', 'Enable', 1)
+        Args:
+            nextFrameNum: (int) first frame number of the new trial, if known. Frames
+                numbered below it that are still on their way (e.g. exposed on the
+                last trial's final clock edges) are discarded when they arrive.
+
+        Returns:
+            nextFrameNum: (int) driver frame number expected next (0 before any frame).
+        """
+        with self._cond:
+            self.nRead = self.nWritten
+            self.overruns = 0
+            self.dropped = []
+            self.duplicates = []
+            expected = self.lastFrameNum + 1 if self.lastFrameNum is not None else 0
+            if nextFrameNum is not None:
+                expected = max(expected, nextFrameNum)
+            self._skipBelow = expected
+            return expected
+
+    @property
+    def nLost(self):
+        """ Frames that never reached the consumer: driver drops plus ring overruns. """
+        return len(self.dropped) + self.overruns
+
+    def dropReport(self):
+        """ Frame drops so far.
+
+        Returns:
+            (dict) 'dropped': list of driver frame numbers that never arrived,
+                'nDropped', 'duplicates': list of frame numbers delivered twice or
+                out of order, 'overruns': frames overwritten before they were read,
+                and 'nLost', driver drops plus overruns.
+        """
+        with self._cond:
+            return {'dropped': list(self.dropped), 'nDropped': len(self.dropped),
+                    'duplicates': list(self.duplicates), 'overruns': self.overruns,
+                    'nLost': self.nLost}
+
+
+def _frameReadyCallback(hGrabber, pBuffer, frameNum, ring):
+    ring.push(pBuffer, frameNum)
+
+
+_frameReadyCallbackPtr = ic.TIS_GrabberDLL.FRAMEREADYCALLBACK(_frameReadyCallback)
+
+
+class _NoRing(object):
+    """ Callback data while no ring is being filled: drops the frame. """
+
+    def push(self, pBuffer, frameNum):
+        pass
+
+
+# lives as long as the module, so the driver always calls back into a live object
+_NO_RING = _NoRing()
+
+
+def startContinuous(cam, nSlots=64, showLive=0):
+    """ Start live mode with every frame pushed into a FrameRing by the driver.
+
+    Args:
+        cam: (TIS_CAM) initialized camera object, video format and sink already set
+        nSlots: (int) ring length in frames
+        showLive: (int) 1 to show the driver's live window, 0 to run headless
+
+    Returns:
+        ring: (FrameRing) ring being filled; call stopContinuous(cam) when done.
+    """
+    lWidth, lHeight, iBitsPerPixel, colorFormat = cam.GetImageDescription()
+    if colorFormat == ic.SinkFormats.Y16.value:
+        ring = FrameRing(nSlots, (lHeight, lWidth, 1), np.uint16)
     else:
-        _set_and_check(cam.SetPropertySwitch, 'Tone Mapping', 'Enable', 0)
+        ring = FrameRing(nSlots, (lHeight, lWidth, iBitsPerPixel // 8))
+    # keep the ring alive as long as the driver can call back into it
+    cam._ring = ring
+    _set_and_check(cam.SetFrameReadyCallback, _frameReadyCallbackPtr, ring)
+    cam.SetContinuousMode(0)
+    _set_and_check(cam.StartLive, showLive)
+    return ring
+
+
+def stopContinuous(cam):
+    """ Stop live mode started by startContinuous and return to snap mode.
+
+    Args:
+        cam: (TIS_CAM) camera object
 
-    print('Parameters set successfully.')
+    Returns:
+        nothing.
+    """
+    cam.StopLive()
+    cam.SetContinuousMode(1)
+    # the driver keeps calling back for snapped frames, and ctypes does not keep
+    # the callback data alive: point it at a permanent object before the ring goes
+    cam.SetFrameReadyCallback(_frameReadyCallbackPtr, _NO_RING)
+    cam._ring = None
+
+
+def startPreview(cam, stage, nSlots=4):
+    """ Look at the live feed headless through a preview.PreviewStage, instead of
+    the driver's live window (StartLive(1)). Frames are pushed by the driver
+    as in startContinuous and offered to the stage from a feeder thread.
+
+    Args:
+        cam: (TIS_CAM) initialized camera object, not live
+        stage: (preview.PreviewStage) preview to offer every frame to
+        nSlots: (int) ring length in frames
+
+    Returns:
+        nothing; call stopPreview(cam) when done.
+    """
+    ring = startContinuous(cam, nSlots, showLive=0)
+    stop = threading.Event()
+
+    def feed():
+        im = np.empty(ring.frames.shape[1:], dtype=ring.frames.dtype)
+        while not stop.is_set():
+            try:
+                frameNum, arrivalNs = ring.pop(im, timeout=0.5)
+            except RuntimeError:
+                continue  # no frame yet; check whether we were stopped
+            stage.offer(im[:, :, 0], frameNum, arrivalNs)
+
+    cam._previewStop = stop
+    cam._previewThread = threading.Thread(target=feed, name='startPreview', daemon=True)
+    cam._previewThread.start()
 
 
-def acquireStack(cam, nFrames, downscaleTuple, animal, outdir):
+def stopPreview(cam):
+    """ Stop live mode started by startPreview. The stage stays open.
+
+    Args:
+        cam: (TIS_CAM) camera object
+
+    Returns:
+        nothing.
+    """
+    cam._previewStop.set()
+    cam._previewThread.join()
+    stopContinuous(cam)
+    cam._previewThread = cam._previewStop = None
+
+
+def _stageReport(nHandled, nDropped=0, nWaits=0, waitTime=0.0):
+    return {'handled': nHandled, 'dropped': nDropped, 'waits': nWaits, 'waitTime': waitTime}
+
+
+class StageQueue(object):
+    """ Bounded queue between two acquisition stages.
+
+    When full, put() either blocks until there is room ('block') or discards the
+    item ('drop'). Drops, waits and time spent waiting are counted for the
+    end-of-run report.
+    """
+
+    def __init__(self, maxsize=64, policy='block'):
+        if policy not in ('block', 'drop'):
+            raise ValueError('Unknown queue policy: %s' % policy)
+        self.policy = policy
+        self.nPut = 0
+        self.nDropped = 0
+        self.nWaits = 0
+        self.waitTime = 0.0
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item):
+        """ Queue one item.
+
+        Returns:
+            (bool) False if the item was dropped.
+        """
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == 'drop':
+                self.nDropped += 1
+                return False
+            self.nWaits += 1
+            t0 = time.perf_counter()
+            self._queue.put(item)
+            self.waitTime += time.perf_counter() - t0
+        self.nPut += 1
+        return True
+
+    def get(self):
+        return self._queue.get()
+
+    def close(self):
+        """ Tell the consumer to stop once it has drained the queue. Never dropped. """
+        self._queue.put(None)
+
+    def report(self, nHandled):
+        return _stageReport(nHandled, self.nDropped, self.nWaits, self.waitTime)
+
+
+class TiffStreamWriter(object):
+    """ Append frames to a BigTIFF file from a background thread.
+
+    Frames are copied into a bounded StageQueue, so peak memory is maxQueue
+    frames no matter how long the recording is; if the disk falls behind, put()
+    blocks or drops according to policy. Everything put before a crash is
+    already on disk.
+    """
+
+    def __init__(self, outfile, maxQueue=64, policy='block'):
+        self.outfile = outfile
+        self.nWritten = 0
+        self._queue = StageQueue(maxQueue, policy)
+        self._error = None
+        import tifffile as tfl
+        self._tif = tfl.TiffWriter(outfile, bigtiff=True)
+        self._thread = threading.Thread(target=self._run, name='TiffStreamWriter', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                self._tif.write(frame, contiguous=True)
+                self.nWritten += 1
+        except Exception as e:
+            self._error = e
+            # keep draining so put() never deadlocks on a dead writer
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._tif.close()
+
+    def put(self, frame):
+        """ Queue a copy of one frame for writing.
+
+        Args:
+            frame: (np.ndarray) 2D frame; may be reused by the caller after return
+
+        Returns:
+            (bool) False if the frame was dropped because the queue was full.
+        """
+        if self._error is not None:
+            raise RuntimeError('TIFF writer failed: %s' % self._error)
+        return self._queue.put(np.array(frame, copy=True))
+
+    def close(self):
+        """ Flush queued frames and close the file.
+
+        Returns:
+            nWritten: (int) number of frames written.
+            raises RuntimeError if any write failed.
+        """
+        self._queue.close()
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError('TIFF writer failed: %s' % self._error)
+        return self.nWritten
+
+    def report(self):
+        return self._queue.report(self.nWritten)
+
+
+def _allocStack(nFrames, frameShape, store, stackfile=None, dtype='int16'):
+    """ Preallocate the (z, x, y) stack that frames are written into.
+
+    Args:
+        nFrames: (int) number of frames
+        frameShape: (tuple) (height, width) of one frame
+        store: (str) 'ram' for an in-memory array, 'memmap' for a .npy file on disk
+        stackfile: (str) path of the .npy file, required for 'memmap'
+        dtype: (str) pixel type, see _stackDtype
+
+    Returns:
+        stack: (np.ndarray or np.memmap) zero-filled stack.
+    """
+    shape = (nFrames,) + tuple(frameShape)
+    if store == 'ram':
+        return np.zeros(shape, dtype=dtype)
+    if store == 'memmap':
+        return np.lib.format.open_memmap(stackfile, mode='w+', dtype=dtype, shape=shape)
+    raise ValueError('Unknown stack store: %s' % store)
+
+
+def setSinkFormat(cam, sinkFormat=ic.SinkFormats.Y800):
+    """ Ask the driver for a sink format, so frames arrive as single-channel images.
+
+    Must be called while the camera is not live.
+
+    Args:
+        cam: (TIS_CAM) opened camera object
+        sinkFormat: (SinkFormats) requested sink format
+
+    Returns:
+        ok: (bool) True if the driver accepted the format. If not, the previous
+            (colour) sink stays active and frames are reduced with _toMono.
+    """
+    if cam.SetFormat(sinkFormat) != 1:
+        return False
+    return cam.GetFormat() == sinkFormat
+
+
+def _stackDtype(cam):
+    """ Pixel type of saved stacks: uint16 for a Y16 sink, so full-range 16 bit pixels
+    survive binning, and int16 as always for 8 bit sinks.
+    """
+    return 'uint16' if cam.GetFormat() == ic.SinkFormats.Y16 else 'int16'
+
+
+def binnedShape(frameShape, nFrames, downscaleTuple):
+    """ Shape of the stack acquireStack makes from nFrames frames.
+
+    Args:
+        frameShape: (tuple) (height, width) of one camera frame
+        nFrames: (int) number of frames
+        downscaleTuple: (tuple) downscale factor in (z, x, y)
+
+    Returns:
+        (tuple) stack shape in (z, x, y).
+    """
+    binZ, binY, binX = downscaleTuple
+    return (-(-nFrames // binZ), -(-frameShape[0] // binY), -(-frameShape[1] // binX))
+
+
+def _toMono(im, out):
+    """ Copy the first channel of a sink frame into a preallocated 2D buffer.
+
+    For a Y800 sink this is the whole frame. For RGB24/RGB32 sinks on our mono
+    cameras the colour channels are identical copies of the grey value, so
+    taking one channel is exact and avoids a float mean over all of them.
+
+    Args:
+        im: (np.ndarray) frame in (x, y, channel) as returned by GetImageEx: uint8,
+            or uint16 with one channel for a Y16 sink
+        out: (np.ndarray) destination in (x, y), e.g. one slot of the stack
+    """
+    np.copyto(out, im[:, :, 0], casting='unsafe')
+
+
+class FrameBinner(object):
+    """ Block-mean downscaling in (z, x, y) as frames arrive.
+
+    Matches transform.downscale_local_mean followed by astype('int16') (or
+    astype('uint16') for 16 bit frames): blocks that don't fill evenly (image
+    edges, a trailing partial z block) are zero-padded and still divided by the
+    full block size, and the integer floor division equals truncating the float
+    mean for our non-negative pixel values. Sums are int32, or int64 for blocks
+    big enough to overflow int32 with 16 bit pixels.
+
+    Write each raw frame into frameBuf, then call push(out); call flush(out)
+    after the last frame to emit a trailing partial z block.
+    """
+
+    def __init__(self, frameShape, downscaleTuple):
+        lHeight, lWidth = frameShape
+        self.binZ, self.binY, self.binX = downscaleTuple
+        self.outShape = (-(-lHeight // self.binY), -(-lWidth // self.binX))
+        accDtype = np.int32 if self.binZ * self.binY * self.binX * 65535 < 2 ** 31 else np.int64
+        self._padded = np.zeros((self.outShape[0] * self.binY, self.outShape[1] * self.binX),
+                                dtype=accDtype)
+        self._blocks = self._padded.reshape(self.outShape[0], self.binY, self.outShape[1], self.binX)
+        self._frameSum = np.zeros(self.outShape, dtype=accDtype)
+        self._acc = np.zeros(self.outShape, dtype=accDtype)
+        self._nAcc = 0
+        self.frameBuf = self._padded[:lHeight, :lWidth]
+
+    def nOut(self, nFrames):
+        """ Number of output frames for nFrames input frames. """
+        return -(-nFrames // self.binZ)
+
+    def push(self, out):
+        """ Add frameBuf to the running z block.
+
+        Args:
+            out: (np.ndarray) int16 (or uint16) destination of shape outShape
+
+        Returns:
+            (bool) True if the z block completed and out was written.
+        """
+        self._blocks.sum(axis=(1, 3), out=self._frameSum)
+        self._acc += self._frameSum
+        self._nAcc += 1
+        if self._nAcc < self.binZ:
+            return False
+        self._emit(out)
+        return True
+
+    def flush(self, out):
+        """ Emit a trailing partial z block, if any.
+
+        Returns:
+            (bool) True if out was written.
+        """
+        if self._nAcc == 0:
+            return False
+        self._emit(out)
+        return True
+
+    def _emit(self, out):
+        np.floor_divide(self._acc, self.binZ * self.binY * self.binX, out=out, casting='unsafe')
+        self._acc[...] = 0
+        self._nAcc = 0
+
+
+# per-frame timestamps, perf_counter_ns; -1 where not available
+TIMING_DTYPE = np.dtype([('ttlNs', np.int64),     # TTL pulse sent (clock edge in 'trigger' mode)
+                         ('snapNs', np.int64),    # frame handed over by the driver
+                         ('copyNs', np.int64),    # frame copied into our buffer
+                         ('frameNum', np.int64)])  # driver frame number
+
+
+def summarizeTiming(timing, gapPeriods=2.0, period=None):
+    """ Summarize frame spacing from per-frame timestamps.
+
+    Args:
+        timing: (np.ndarray) TIMING_DTYPE records, as saved by acquireStack
+        gapPeriods: (float) report intervals longer than this many frame periods
+        period: (float) expected frame period in s; the median interval if None
+
+    Returns:
+        (dict) 'nFrames', 'intervalMs' (mean, std, max) between successive frames,
+            'periodMs' used for gap detection, and 'gaps': list of
+            (frame index, interval in ms) for each interval over the threshold.
+    """
+    intervals = np.diff(timing['snapNs']) / 1e6
+    if len(intervals) == 0:
+        return {'nFrames': len(timing), 'intervalMs': None, 'periodMs': None, 'gaps': []}
+    periodMs = period * 1e3 if period is not None else float(np.median(intervals))
+    iGaps = np.flatnonzero(intervals > gapPeriods * periodMs)
+    return {'nFrames': len(timing),
+            'intervalMs': {'mean': float(intervals.mean()), 'std': float(intervals.std()),
+                           'max': float(intervals.max())},
+            'periodMs': periodMs,
+            'gaps': [(int(iG + 1), float(intervals[iG])) for iG in iGaps]}
+
+
+def _printReport(report):
+    print('{:>8} {:>8} {:>8} {:>8} {:>9}'.format('stage', 'handled', 'dropped', 'waits', 'wait (s)'))
+    for name, st in report.items():
+        if 'waits' not in st:
+            continue
+        print('{:>8} {:>8} {:>8} {:>8} {:>9.3f}'.format(name, st['handled'], st['dropped'],
+                                                      st['waits'], st['waitTime']))
+
+
+def _outBase(outdir, animal, t):
+    """ Output path without extension: <animal>_<time>, with a counter appended if a
+    stack by that name already exists (several trials within a second).
+    """
+    base = os.path.join(outdir, '{}{}'.format(animal, time.strftime("_%y%m%d_%H-%M-%S", time.localtime(t))))
+    outBase, n = base, 0
+    while os.path.exists(outBase + '.tif'):
+        n += 1
+        outBase = '{}_{}'.format(base, n)
+    return outBase
+
+
+_TRIGGER = camprops.Setting('switch', 'Trigger', 'Enable')
+
+
+class AcquisitionSession(object):
+    """ Camera and LabJack kept open and live across many acquisitions.
+
+    Opening the U6 and starting live mode take seconds, which acquireStack pays
+    on every call. A session pays them once in open(); each record() then only
+    sets up its buffers and the per-trial sync, so trials can run back to back.
+    In 'callback' mode the driver keeps filling the ring between trials and
+    record() starts from the newest frame; in 'trigger' mode the camera idles
+    between trials because the LabJack clock only runs during record().
+
+        with ICtools.AcquisitionSession(cam, outdir, mode='callback', labjack=u6) as session:
+            for iTrial in range(200):
+                session.record(30, (1, 2, 2), 'mouse1_trial%03d' % iTrial)
+
+    close() (or leaving the with block, also on an exception) stops live mode,
+    turns the trigger switch off and closes the U6.
+
+    Args:
+        cam: (TIS_CAM) initialized camera object
+        outdir: (str) path to output directory
+        mode: (str) 'snap', 'callback' or 'trigger', see acquireStack
+        sinkFormat: (SinkFormats) sink to request before going live, or None to keep
+            the current one
+        labjack: (module) LabJack driver module, see acquireStack
+        threadedTTL: (bool) send the per-frame TTL from a separate thread
+        frameRate: (float) hardware clock rate in 'trigger' mode
+        showLive: (int) 1 to show the driver's live window, 0 to run headless
+        nSlots: (int) ring length in frames in 'callback' and 'trigger' mode
+        clock: (ljsync.HardwareClock) in 'trigger' mode, a clock run by someone else
+            (e.g. multicam.MultiCamRecorder for several cameras on one U6). The
+            session then opens no LabJack; record() calls clock.start() once it is
+            ready for frames and clock.close() when done. If the clock is still
+            running then, call clockStopped() once it has stopped.
+        share: (str or bool) also publish every recorded frame into a
+            sharedring.SharedFrameRing for other processes to watch: the shared
+            memory name readers attach to, True for a generated one (see
+            self.share.name), or None. The ring lives from open() to close(), so
+            readers stay attached across trials.
+        shareSlots: (int) length of the shared ring in frames
+        preview: (preview.PreviewStage) offer every recorded frame to this
+            preview; it takes what it needs without ever holding up the recording
+        tracker: (pupil.PupilTracker) track the pupil in every binned frame as it
+            is made, see acquireStack
+        output: (ljsync.MetricOutput) write a tracked metric to the U6 for every
+            frame, see acquireStack. Needs a tracker and the session's own U6.
+    """
+    dioPortNum = 0  # FIO0
+
+    def __init__(self, cam, outdir, mode='snap', sinkFormat=ic.SinkFormats.Y800, labjack=None,
+                 threadedTTL=True, frameRate=15.0, showLive=1, nSlots=64, clock=None, share=None,
+                 shareSlots=16, preview=None, tracker=None, output=None):
+        if mode not in ('snap', 'callback', 'trigger'):
+            raise ValueError('Unknown acquisition mode: %s' % mode)
+        self.cam = cam
+        self.outdir = outdir
+        self.mode = mode
+        self.sinkFormat = sinkFormat
+        self.labjack = labjack
+        self.threadedTTL = threadedTTL
+        self.frameRate = frameRate
+        self.showLive = showLive
+        self.nSlots = nSlots
+        if clock is not None and mode != 'trigger':
+            raise ValueError("A shared clock needs mode='trigger'")
+        self.clock = clock
+        if output is not None:
+            if tracker is None:
+                raise ValueError('Closed-loop output needs a tracker')
+            if clock is not None:
+                raise ValueError('Closed-loop output needs the session to open its own U6')
+            if output.dioPortNum == self.dioPortNum:
+                raise ValueError('Output line FIO%d is the TTL line' % self.dioPortNum)
+        self.shareName = share
+        self.shareSlots = shareSlots
+        self.share = None
+        self.preview = preview
+        self.tracker = tracker
+        self.output = output
+        self.u6Obj = None
+        self.ring = None
+        self.nRecorded = 0
+        self._live = False
+        self._triggerOn = False
+        self._triggerFirstFrame = None  # driver frame number of the last trial's first clock edge
+        self._nextTriggerFrame = None  # ... and of the next trial's, once the last one's edges are counted
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+        return False
+
+    def open(self):
+        """ Open the U6, set the sink and start live mode.
+
+        Returns:
+            self.
+        """
+        try:
+            if self.clock is None:
+                self.labjack, self.u6Obj = ljsync.openU6(self.labjack, self.dioPortNum)
+            if self.output is not None:
+                self.output.open(self.labjack, self.u6Obj)
+            if self.sinkFormat is not None and not setSinkFormat(self.cam, self.sinkFormat):
+                print('Could not set {} sink, using {}.'.format(self.sinkFormat.name,
+                                                                self.cam.GetFormat().name))
+            if self.shareName:
+                import sharedring
+                lWidth, lHeight = self.cam.GetImageDescription()[:2]
+                frameDtype = np.uint16 if _stackDtype(self.cam) == 'uint16' else np.uint8
+                self.share = sharedring.SharedFrameRing(
+                    (lHeight, lWidth), frameDtype, self.shareSlots,
+                    None if self.shareName is True else self.shareName)
+            if self.mode == 'trigger':
+                camprops.propertyCache(self.cam).set(_TRIGGER, 1)
+                self._triggerOn = True
+            if self.mode in ('callback', 'trigger'):
+                self.ring = startContinuous(self.cam, self.nSlots, self.showLive)
+            else:
+                _set_and_check(self.cam.StartLive, self.showLive)
+            self._live = True
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        """ Stop live mode, close the shared ring and the U6. Safe to call more than once. """
+        try:
+            if self._live:
+                self._live = False
+                if self.ring is not None:
+                    stopContinuous(self.cam)
+                    self.ring = None
+                else:
+                    self.cam.StopLive()
+            if self._triggerOn:
+                self._triggerOn = False
+                try:
+                    camprops.propertyCache(self.cam).set(_TRIGGER, 0)
+                except RuntimeError as e:
+                    print('Warning: could not turn trigger mode off: {}'.format(e))
+        finally:
+            if self.share is not None:
+                self.share.close()
+                self.share = None
+            if self.output is not None and self.output.u6Obj is not None:
+                try:
+                    self.output.close()
+                except RuntimeError as e:
+                    print('Warning: {}'.format(e))
+            if self.u6Obj is not None:
+                self.u6Obj.close()
+                self.u6Obj = None
+
+    def _openSync(self, nFrames):
+        if self.clock is not None:
+            return self.clock
+        if self.mode == 'trigger':
+            return ljsync.HardwareClock(self.labjack, self.dioPortNum, self.frameRate, u6Obj=self.u6Obj)
+        return ljsync.TTLSync(self.labjack, self.dioPortNum, threaded=self.threadedTTL, u6Obj=self.u6Obj,
+                              nPulses=nFrames)
+
+    def clockStopped(self, nEdges):
+        """ Tell the session how many edges a shared clock issued during the last
+        record(), once its owner has stopped it. Frames exposed on those edges
+        that are still arriving are then kept out of the next record().
+
+        Args:
+            nEdges: (int) edges issued, len(clock.pulseTimes()) after clock.stop()
+        """
+        if self._triggerFirstFrame is not None:
+            self._nextTriggerFrame = self._triggerFirstFrame + nEdges
+
+    def record(self, nFrames, downscaleTuple, animal, stream=False, store='ram', threaded=False,
+               queueSize=64, queuePolicy='block', returnReport=False, gapPeriods=2.0,
+               maxDropped=None, dropAction='warn', out=None):
+        """ Acquire and save one stack with the open camera and LabJack.
+
+        Args:
+            nFrames: (int) number of frames to acquire
+            downscaleTuple: (tuple) downscale factor in (z, x, y)
+            animal: (str) animal ID, used for output naming
+            out: (np.ndarray) preallocated stack to fill instead of allocating one,
+                e.g. in shared memory, with shape binnedShape(...) and dtype int16
+                (uint16 with a Y16 sink). Not used when streaming; store is ignored.
+            See acquireStack for the other arguments.
+
+        Returns:
+            stack, and report if returnReport, as acquireStack.
+        """
+        if not self._live:
+            raise RuntimeError('Session is not open')
+        if dropAction not in ('warn', 'abort'):
+            raise ValueError('Unknown drop action: %s' % dropAction)
+        import tifffile as tfl
+
+        cam, mode, ring, share, stage = self.cam, self.mode, self.ring, self.share, self.preview
+        tracker, output = self.tracker, self.output
+        t_start = time.time()
+        outBase = _outBase(self.outdir, animal, t_start)
+        outfile = outBase + '.tif'
+
+        lWidth, lHeight = cam.GetImageDescription()[:2]
+        binner = FrameBinner((lHeight, lWidth), downscaleTuple)
+        stackDtype = _stackDtype(cam)
+        if stream:
+            writer = TiffStreamWriter(outfile, queueSize, queuePolicy)
+            frame = np.empty(binner.outShape, dtype=stackDtype)
+        elif out is not None:
+            if out.shape != (binner.nOut(nFrames),) + binner.outShape or out.dtype != stackDtype:
+                raise ValueError('out must be {} {}, got {} {}'.format(
+                    (binner.nOut(nFrames),) + binner.outShape, stackDtype, out.shape, out.dtype))
+            stack = out
+        else:
+            stack = _allocStack(binner.nOut(nFrames), binner.outShape, store, outBase + '_stack.npy',
+                                stackDtype)
+
+        counts = {'grab': 0, 'convert': 0, 'write': 0, 'tracked': 0}
+        dropLimitHit = False
+        timing = np.full(nFrames, -1, dtype=TIMING_DTYPE)
+        if tracker is not None:
+            import pupil
+            trace = pupil.newTrace(binner.nOut(nFrames))
+
+        def track(outFrame, iF):
+            # pupil in a finished output frame; iF is the last grabbed frame in it
+            row = trace[counts['tracked']:counts['tracked'] + 1]
+            row['frameNum'], row['snapNs'] = timing['frameNum'][iF], timing['snapNs'][iF]
+            if tracker.process(outFrame, row) and output is not None:
+                output.write(float(row[output.field][0]), int(row['snapNs'][0]))
+            counts['tracked'] += 1
+
+        def binFrame(iF):
+            # downscale binner.frameBuf, then store or queue any finished output frame
+            counts['convert'] += 1
+            if stream:
+                if binner.push(frame):
+                    if tracker is not None:
+                        track(frame, iF)
+                    writer.put(frame)
+            elif binner.push(stack[counts['write']]):
+                if tracker is not None:
+                    track(stack[counts['write']], iF)
+                counts['write'] += 1
+
+        if threaded:
+            workQueue = StageQueue(queueSize, queuePolicy)
+            freeBufs = queue.Queue()
+            for iB in range(queueSize + 2):  # queued + one in each stage
+                freeBufs.put(np.empty(binner.frameBuf.shape, dtype=binner.frameBuf.dtype))
+            workErrors = []
+
+            def convertLoop():
+                try:
+                    while True:
+                        item = workQueue.get()
+                        if item is None:
+                            break
+                        buf, iF = item
+                        np.copyto(binner.frameBuf, buf)
+                        freeBufs.put(buf)
+                        binFrame(iF)
+                except Exception as e:
+                    workErrors.append(e)
+                    # keep draining so the grab loop never deadlocks on a dead worker
+                    while True:
+                        item = workQueue.get()
+                        if item is None:
+                            break
+                        freeBufs.put(item[0])
+
+            worker = threading.Thread(target=convertLoop, name='acquireStack-convert', daemon=True)
+            worker.start()
+
+        if ring is not None:
+            im = np.empty(ring.frames.shape[1:], dtype=ring.frames.dtype)
+            # frames from before this trial are not part of it. In 'trigger' mode that
+            # includes frames from the last trial's final clock edges still in flight,
+            # so the first frame of this trial is the first edge of its clock.
+            firstFrameNum = ring.reset(self._nextTriggerFrame)
+            self._nextTriggerFrame = None
+        sync = self._openSync(nFrames)
+        if output is not None:
+            output.start(binner.nOut(nFrames))
+        # Not using 191001: strobe code below.
+        # if sendCounter:
+        #     _set_and_check(cam.SetPropertyValue, 'GPIO', 'GP Out', 1)
+        #     _set_and_check(cam.PropertyOnePush, 'GPIO', 'Write')
+        try:
+            if mode == 'trigger':
+                sync.start()
+            for iF in range(nFrames):
+                t = timing[iF:iF + 1]
+                if mode == 'trigger':
+                    t['frameNum'], t['snapNs'] = ring.pop(im)
+                elif mode == 'callback':
+                    sync.pulse()
+                    t['frameNum'], t['snapNs'] = ring.pop(im)
+                else:
+                    sync.pulse()
+                    cam.SnapImage()
+                    t['snapNs'] = time.perf_counter_ns()
+                    im = cam.GetImageEx()  # borrowed until the next snap; copied just below
+                if ring is not None and maxDropped is not None and not dropLimitHit \
+                        and ring.nLost > maxDropped:
+                    dropLimitHit = True
+                    print('Warning: {} frames lost by frame {}, over the limit of {}.'.format(
+                        ring.nLost, iF, maxDropped))
+                    if dropAction == 'abort':
+                        break
+                if share is not None:
+                    share.publish(im[:, :, 0], t['frameNum'][0], t['snapNs'][0])
+                if stage is not None:
+                    stage.offer(im[:, :, 0], t['frameNum'][0], t['snapNs'][0])
+                counts['grab'] += 1
+                if threaded:
+                    if workErrors:
+                        break
+                    buf = freeBufs.get()
+                    _toMono(im, buf)
+                    t['copyNs'] = time.perf_counter_ns()
+                    if not workQueue.put((buf, iF)):
+                        freeBufs.put(buf)
+                else:
+                    _toMono(im, binner.frameBuf)
+                    t['copyNs'] = time.perf_counter_ns()
+                    binFrame(iF)
+        finally:
+            # Not using 191001: strobe code below.
+            # if sendCounter:
+            #     _set_and_check(cam.SetPropertyValue, 'GPIO', 'GP Out', 0)
+            #     _set_and_check(cam.PropertyOnePush, 'GPIO', 'Write')
+
+            sync.close()
+            if mode == 'trigger':
+                self._triggerFirstFrame = firstFrameNum
+                if sync.startNs is not None and sync.stopNs is not None:
+                    self.clockStopped(len(sync.pulseTimes()))
+            if ring is not None:
+                if ring.dropped:
+                    print('Warning: camera driver dropped {} frames.'.format(len(ring.dropped)))
+                if ring.duplicates:
+                    print('Warning: {} repeated or out-of-order frame numbers.'.format(len(ring.duplicates)))
+                if ring.overruns:
+                    print('Warning: ring buffer overran, {} frames lost.'.format(ring.overruns))
+            if threaded:
+                workQueue.close()
+                worker.join()
+            if stream:
+                print('Done. Flushing writer.')
+                if binner.flush(frame):
+                    if tracker is not None and counts['grab']:
+                        track(frame, counts['grab'] - 1)
+                    writer.put(frame)
+                writer.close()
+        if threaded and workErrors:
+            raise RuntimeError('Conversion worker failed: %s' % workErrors[0])
+
+        if stream:
+            stack = tfl.memmap(outfile, mode='r')
+        else:
+            print('Done. Saving.')
+            if counts['write'] < stack.shape[0] and binner.flush(stack[counts['write']]):
+                if tracker is not None:
+                    track(stack[counts['write']], counts['grab'] - 1)
+                counts['write'] += 1  # trailing partial z block
+            stack = stack[:counts['write']]  # shorter only if frames were dropped
+            if store == 'memmap' and out is None:
+                stack.flush()
+            tfl.imwrite(outfile, stack)
+            if store == 'memmap' and out is None:
+                # the tif now holds the stack: map that instead and drop the scratch file
+                stack = tfl.memmap(outfile, mode='r')
+                try:
+                    os.remove(outBase + '_stack.npy')
+                except OSError as e:
+                    print('Warning: could not remove {}_stack.npy: {}'.format(outBase, e))
+        if output is not None:
+            outputLog = output.stop()
+        nSaved = stack.shape[0]
+        self.nRecorded += 1
+
+        print('Saved {} frames to {}'.format(nSaved, outfile))
+
+        timing = timing[:counts['grab']]
+        if mode == 'trigger':
+            # the first frame after the ring reset was exposed on the first clock edge
+            edges = sync.pulseTimes()
+            iEdge = timing['frameNum'] - firstFrameNum
+            valid = (iEdge >= 0) & (iEdge < len(edges))
+            timing['ttlNs'][valid] = edges[iEdge[valid]]
+            timingSummary = summarizeTiming(timing, gapPeriods, 1. / sync.frameRate)
+        else:
+            # pulse n was requested for frame n
+            issueNs = sync.timestamps()['issueNs']
+            timing['ttlNs'][:len(issueNs)] = issueNs[:len(timing)]
+            timingSummary = summarizeTiming(timing, gapPeriods)
+        np.save(outBase + '_timing.npy', timing)
+        if timingSummary['intervalMs'] is not None:
+            print('Frame interval {mean:.2f} +/- {std:.2f} ms, max {max:.2f} ms; '.format(
+                **timingSummary['intervalMs']) + '{} gaps over {} periods.'.format(
+                len(timingSummary['gaps']), gapPeriods))
+        if tracker is not None:
+            trace = trace[:counts['tracked']]
+            np.save(outBase + '_pupil.npy', trace)
+            pupilSummary = pupil.summarizeTrace(trace)
+            print('Pupil found in {:.0%} of {} frames.'.format(pupilSummary['found'], len(trace)))
+        if output is not None:
+            np.save(outBase + '_output.npy', outputLog)
+            if mode == 'trigger':
+                periodNs = 1e9 / sync.frameRate
+            else:
+                periodNs = float(np.median(np.diff(timing['snapNs']))) if len(timing) > 1 else None
+            outputReport = output.report(outputLog, periodNs)
+            if outputReport['latencyMs'] is not None:
+                print('Output latency {p50:.2f} ms median, max {max:.2f} ms; '.format(
+                    **outputReport['latencyMs']) + '{} of {} writes over one frame period.'.format(
+                    outputReport['overPeriod'], outputReport['written']))
+
+        report = {
+            'grab': _stageReport(counts['grab'], ring.nLost if ring is not None else 0),
+            'convert': workQueue.report(counts['convert']) if threaded else _stageReport(counts['convert']),
+            'write': writer.report() if stream else _stageReport(counts['write']),
+            'ttl': sync.report(),
+            'timing': timingSummary,
+        }
+        if ring is not None:
+            report['drops'] = ring.dropReport()
+        if tracker is not None:
+            report['pupil'] = pupilSummary
+        if output is not None:
+            report['output'] = outputReport
+        if threaded or report['grab']['dropped']:
+            _printReport(report)
+        if dropLimitHit and dropAction == 'abort':
+            raise RuntimeError('Acquisition aborted after {} lost frames; {} frames saved to {}'.format(
+                report['grab']['dropped'], nSaved, outfile))
+        if returnReport:
+            return stack, report
+        return stack
+
+
+def acquireStack(cam, nFrames, downscaleTuple, animal, outdir, mode='snap', stream=False,
+                 store='ram', sinkFormat=ic.SinkFormats.Y800, threaded=False,
+                 queueSize=64, queuePolicy='block', returnReport=False, labjack=None,
+                 threadedTTL=True, frameRate=15.0, gapPeriods=2.0, maxDropped=None,
+                 dropAction='warn', share=None, showLive=1, preview=None, tracker=None,
+                 output=None):
     """   Get an image stack from the camera.
      Args:
         cam: (TIS_CAM) initialized camera object
@@ -127,53 +1137,74 @@ def acquireStack(cam, nFrames, downscaleTuple, animal, outdir):
         downscaleTuple: (tuple) downscale factor in (z, x, y), e.g. (1, 2, 2) for 2x downscale
         animal: (str) animal ID, used for output naming
         outdir: (str) path to output directory
+        mode: (str) 'snap' to snap each frame in turn, 'callback' to let the driver
+            push every frame into a ring buffer (continuous mode, full sensor rate), or
+            'trigger' to run the camera in trigger mode off a LabJack hardware clock on
+            the TTL line, with frames collected as in 'callback'
+        stream: (bool) write each frame to a BigTIFF as it arrives instead of keeping
+            the stack in memory
+        store: (str) where the stack lives when not streaming: 'ram', or 'memmap' for
+            a scratch <animal>_<time>_stack.npy file in outdir, removed once the tif
+            is written (the returned stack is then a read-only map of the tif)
+        sinkFormat: (SinkFormats) sink to request before going live, or None to keep
+            the current one. Falls back to the current sink if the driver refuses.
+            Y16 keeps the sensor's full bit depth through to a uint16 stack.
+        threaded: (bool) run conversion and downscaling on a worker thread, so the grab
+            loop only copies frames and never waits on binning or disk
+        queueSize: (int) frames held by each queue between stages
+        queuePolicy: (str) what a full queue does: 'block' the upstream stage, or 'drop'
+            the frame and count it
+        returnReport: (bool) also return the per-stage report
+        labjack: (module) LabJack driver module, u6 by default. Pass fakeu6 (and a
+            simcam.SimCam as cam) to run without hardware.
+        threadedTTL: (bool) send the per-frame TTL from a separate thread, so the grab
+            loop never waits on USB. False sends it inline before each snap, as before.
+        frameRate: (float) hardware clock rate in 'trigger' mode; the U6 timer gets as
+            close as it can (see ljsync.timerSettings)
+        gapPeriods: (float) frame intervals longer than this many periods are reported
+            as gaps
+        maxDropped: (int) in 'callback' and 'trigger' mode, how many frames may be lost
+            (skipped driver frame numbers plus ring overruns) before dropAction is
+            taken. None for no limit.
+        dropAction: (str) 'warn' to print a warning once the limit is passed and carry
+            on, or 'abort' to stop, save the frames so far and raise RuntimeError
+        share: (str) shared memory name to publish every frame under while recording,
+            so other processes can watch (see sharedring.SharedFrameReader), or None
+        showLive: (int) 1 to show the driver's live window, 0 to run headless
+        preview: (preview.PreviewStage) headless preview to offer every frame to,
+            which never holds up the recording; use with showLive=0
+        tracker: (pupil.PupilTracker) track the pupil online in every binned frame,
+            on the thread that bins (the worker if threaded). The trace, one
+            pupil.PUPIL_DTYPE row per stack frame, is saved to
+            <animal>_<time>_pupil.npy next to the stack.
+        output: (ljsync.MetricOutput) closed loop: write one field of the pupil trace
+            to a U6 DAC or digital line as soon as each frame is tracked. Every
+            write is logged (ljsync.OUTPUT_DTYPE) to <animal>_<time>_output.npy
+            with its frame's arrival time. Use with mode='callback' or 'trigger',
+            and threaded=False for the lowest latency.
 
-    Returns:
-        stack: (np.ndarray) image stack in (z, x, y)
-    """
-    # setup the labjack
-    dioPortNum = 0  # FIO0
-    u6Obj = u6.U6()
-    u6Obj.configU6()
-    u6Obj.configIO()
-    u6Obj.setDOState(dioPortNum, state=0)
-
-    stack = []
-
-    cam.StartLive(1)
-    # Not using 191001: strobe code below.
-    # if sendCounter:
-    #     _set_and_check(cam.SetPropertyValue, 'GPIO', 'GP Out', 1)
-    #     _set_and_check(cam.PropertyOnePush, 'GPIO', 'Write')
-    t_start = time.time()
-    for iF in np.arange(nFrames):
-        pulseLengthTicks = int(1000/64)
-        u6Obj.getFeedback(u6.BitDirWrite(dioPortNum, 1),
-                          u6.BitStateWrite(dioPortNum, State=1),
-                          u6.WaitShort(pulseLengthTicks),
-                          u6.BitStateWrite(dioPortNum, State=0))
-        cam.SnapImage()
-        im = cam.GetImage()  # appears to have three identical(?) frames
-        im = np.mean(im, axis=2).astype('int16')
-        stack.append(im)  # averaging to one frame
-
-    # Not using 191001: strobe code below.
-    # if sendCounter:
-    #     _set_and_check(cam.SetPropertyValue, 'GPIO', 'GP Out', 0)
-    #     _set_and_check(cam.PropertyOnePush, 'GPIO', 'Write')
-
-    cam.StopLive()
-
-    print('Done. Downsizing and saving.')
-    stack = np.r_[stack]
-    stack = transform.downscale_local_mean(stack, downscaleTuple)
-    stack = stack.astype('int16')
+    Each call opens the LabJack and starts live mode afresh; to record many stacks
+    back to back, use an AcquisitionSession and call its record() instead.
 
-    timeStr = time.strftime("_%y%m%d_%H-%M-%S", time.localtime(t_start))
-    outfile = os.path.join(outdir, '{}{}.tif'.format(animal, timeStr))
-    tfl.imsave(outfile, stack)
-    nFrames = stack.shape[0]
+    Per-frame timestamps (TTL, driver hand-over, copy; perf_counter_ns) and driver
+    frame numbers are saved to <animal>_<time>_timing.npy next to the stack, see
+    TIMING_DTYPE and summarizeTiming.
 
-    print('Saved {} frames to {}'.format(nFrames, outfile))
-
-    return stack
+    Returns:
+        stack: (np.ndarray) image stack in (z, x, y), int16, or uint16 with a Y16 sink.
+            If streaming, a read-only memory map of the written file.
+        report: (dict) only if returnReport. Frames handled, dropped and waited on
+            per stage ('grab', 'convert', 'write'); drops and waits are counted at
+            each stage's input. 'ttl' has the pulse count and issue lag, or in
+            'trigger' mode the clock pulse count and actual rate. 'timing' is the
+            summarizeTiming result. In 'callback' and 'trigger' mode 'drops' is
+            FrameRing.dropReport, and the 'grab' drop count includes driver drops.
+            With a tracker, 'pupil' is pupil.summarizeTrace. With an output,
+            'output' is MetricOutput.report: frame-to-output latency and the
+            number of writes later than one frame period.
+    """
+    with AcquisitionSession(cam, outdir, mode, sinkFormat, labjack, threadedTTL, frameRate,
+                            showLive, share=share, preview=preview, tracker=tracker,
+                            output=output) as session:
+        return session.record(nFrames, downscaleTuple, animal, stream, store, threaded, queueSize,
+                              queuePolicy, returnReport, gapPeriods, maxDropped, dropAction)
@@ -0,0 +1,440 @@
+"""
+Acquisition benchmarks for ICtools.acquireStack.
+
+Runs acquireStack over a grid of settings, each in a fresh subprocess so peak
+memory is per run, and writes the results to JSON. Runs against the simulated
+camera and fake LabJack by default, or the real rig with --camera real.
+
+    python benchmark.py --out bench.json
+    python benchmark.py --resolutions 640x480,1280x960 --downscales 1x2x2,4x2x2 --out new.json
+    python benchmark.py --out new.json --compare bench.json
+    python benchmark.py --sinks Y800,Y16 --writers ram,stream --out depth.json
+    python benchmark.py --pupil --writers ram --modes callback --out pupil.json
+    python benchmark.py --check-imports --importBudget 0.5
+    python benchmark.py --cameras 3 --frameRate 100 --sinks Y800 --out multi.json
+
+Per run it reports sustained fps, percentiles of the interval between frames
+and of the hand-over-to-copy latency (from the per-frame timing acquireStack
+saves), peak RSS and bytes written per second. The import time of ICtools is measured once per
+invocation. With --pupil every run also tracks the pupil online, and
+PupilTracker.process is timed on its own per resolution and downscale, to show
+the frame rate one core can track at. With --cameras N it records from N cameras
+at once with multicam.MultiCamRecorder, in trigger mode off one clock, and
+reports each camera's fps and the aggregate over all of them.
+
+--check-imports only checks, in a fresh interpreter, that importing ICtools
+loads neither the camera DLL nor tifffile, u6, skimage or scipy, and stays
+within a time budget.
+"""
+import argparse
+import contextlib
+import glob
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _peakRSS():
+    """ Peak resident memory of this process in bytes, or None if unavailable. """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def _gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=_HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def importTime(nRepeats=5):
+    """ Time a cold `import ICtools` in fresh interpreters.
+
+    Returns:
+        (float) median import time in seconds.
+    """
+    code = 'import time; t = time.perf_counter(); import ICtools; print(time.perf_counter() - t)'
+    times = [float(subprocess.check_output([sys.executable, '-c', code], cwd=_HERE))
+             for iR in range(nRepeats)]
+    return float(np.median(times))
+
+
+# run in a fresh interpreter by checkImports; prints a JSON result
+_IMPORT_CHECK = '''
+import json, sys, time
+t = time.perf_counter()
+import tisgrabber
+dllLoaded = tisgrabber._tisgrabber is not None
+import ICtools
+seconds = time.perf_counter() - t
+print(json.dumps({'seconds': seconds, 'dllLoaded': dllLoaded or tisgrabber._tisgrabber is not None,
+                  'heavy': [m for m in %r if m in sys.modules]}))
+'''
+
+HEAVY_MODULES = ('tifffile', 'u6', 'skimage', 'scipy')
+
+
+def checkImports(budget=1.0):
+    """ Check in a fresh interpreter that importing ICtools stays cheap: the
+    tisgrabber DLL is not loaded, none of HEAVY_MODULES is imported, and the
+    import takes less than budget seconds.
+
+    Args:
+        budget: (float) seconds allowed for `import tisgrabber, ICtools`
+
+    Returns:
+        (list) failures, one string each; empty if all checks pass.
+    """
+    out = subprocess.check_output([sys.executable, '-c', _IMPORT_CHECK % (HEAVY_MODULES,)], cwd=_HERE)
+    r = json.loads(out.decode().strip().splitlines()[-1])
+    failures = []
+    if r['dllLoaded']:
+        failures.append('importing tisgrabber/ICtools loaded the tisgrabber DLL')
+    for name in r['heavy']:
+        failures.append('importing ICtools imported {}'.format(name))
+    if r['seconds'] > budget:
+        failures.append('import took {:.3f} s, budget {:.3f} s'.format(r['seconds'], budget))
+    print('import tisgrabber, ICtools: {:.3f} s (budget {:.3f} s)'.format(r['seconds'], budget))
+    return failures
+
+
+def _openCamera(cfg):
+    import tisgrabber as ic
+    sinkFormat = ic.SinkFormats[cfg['sink']]
+    width, height = cfg['resolution']
+    if cfg['camera'] == 'sim':
+        import fakeu6
+        import simcam
+        cam = simcam.SimCam(width=width, height=height, sinkFormat=sinkFormat,
+                            frameRate=cfg['frameRate'], seed=0)
+        labjack = fakeu6
+    else:
+        import ICtools
+        import u6
+        cam = ic.TIS_CAM()
+        ICtools.setCameraDefaults(cam)
+        ICtools._set_and_check(cam.SetVideoFormat, '{} ({}x{})'.format(cfg['sink'], width, height))
+        ICtools._set_and_check(cam.SetFrameRate, cfg['frameRate'])
+        labjack = u6
+    return cam, labjack, sinkFormat
+
+
+def _percentiles(x):
+    return {'mean': float(np.mean(x)), 'p50': float(np.percentile(x, 50)),
+            'p95': float(np.percentile(x, 95)), 'p99': float(np.percentile(x, 99)),
+            'max': float(np.max(x))}
+
+
+def pupilTiming(resolution, downscale, nRepeats=300):
+    """ Time pupil.PupilTracker.process alone on simulated eye frames, binned as
+    acquireStack bins them.
+
+    Args:
+        resolution: (list) camera frame [width, height]
+        downscale: (list) [z, x, y] downscale; z is ignored
+
+    Returns:
+        (dict) resolution, downscale, binned frame shape, 'processMs' percentiles and
+        'maxFps', the frame rate one core could track at (from the mean time).
+    """
+    import ICtools
+    import pupil
+    import simcam
+    width, height = resolution
+    cam = simcam.SimCam(width=width, height=height, seed=0)
+    binner = ICtools.FrameBinner((height, width), (1,) + tuple(downscale[1:]))
+    frames = []
+    for grey in cam._grey:
+        binner.frameBuf[...] = grey >> 8
+        frames.append(np.empty(binner.outShape, dtype=np.int16))
+        binner.push(frames[-1])
+    tracker = pupil.PupilTracker()
+    row = pupil.newTrace(1)
+    tracker.process(frames[0], row)  # sets the threshold
+    times = np.empty(nRepeats)
+    for iR in range(nRepeats):
+        t0 = time.perf_counter_ns()
+        tracker.process(frames[iR % len(frames)], row)
+        times[iR] = (time.perf_counter_ns() - t0) / 1e6
+    return {'resolution': resolution, 'downscale': downscale, 'shape': list(binner.outShape),
+            'processMs': _percentiles(times), 'maxFps': 1e3 / float(np.mean(times))}
+
+
+def runOne(cfg):
+    """ Run one acquisition and measure it. Meant to run in its own process.
+
+    Args:
+        cfg: (dict) one point of the benchmark grid, see configGrid
+
+    Returns:
+        (dict) cfg plus the measurements.
+    """
+    import ICtools
+
+    cam, labjack, sinkFormat = _openCamera(cfg)
+    writer = cfg['writer']
+    tracker = None
+    if cfg.get('pupil'):
+        import pupil
+        tracker = pupil.PupilTracker()
+    with tempfile.TemporaryDirectory() as outdir:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stack, report = ICtools.acquireStack(
+                cam, cfg['nFrames'], tuple(cfg['downscale']), 'bench', outdir,
+                mode=cfg['mode'], stream=(writer == 'stream'),
+                store=('memmap' if writer == 'memmap' else 'ram'), sinkFormat=sinkFormat,
+                threaded=cfg['threaded'], returnReport=True, labjack=labjack, tracker=tracker)
+        elapsed = time.perf_counter() - t0
+        nBytes = sum(os.path.getsize(os.path.join(outdir, f)) for f in os.listdir(outdir))
+        timing = np.load(glob.glob(os.path.join(outdir, '*_timing.npy'))[0])
+        del stack
+
+    result = dict(cfg)
+    result.update({
+        'elapsed': elapsed,
+        'fps': report['grab']['handled'] / elapsed,
+        'periodMs': _percentiles(np.diff(timing['snapNs']) / 1e6),
+        'copyLatencyMs': _percentiles((timing['copyNs'] - timing['snapNs']) / 1e6),
+        'peakRSS': _peakRSS(),
+        'bytesWritten': nBytes,
+        'bytesPerSec': nBytes / elapsed,
+        'report': report,
+    })
+    return result
+
+
+def _multiCamOpeners(cfg):
+    """ Picklable camera openers for MultiCamRecorder, and the labjack module. """
+    import functools
+    import multicam
+    import tisgrabber as ic
+    width, height = cfg['resolution']
+    if cfg['camera'] == 'sim':
+        import fakeu6
+        import simcam
+        openers = {}
+        for iCam in range(cfg['cameras']):
+            line = fakeu6.TriggerLine()
+            fakeu6.connectTrigger(line)
+            openers['cam%d' % iCam] = functools.partial(
+                simcam.openConnected, line, width=width, height=height,
+                sinkFormat=ic.SinkFormats[cfg['sink']], frameRate=cfg['frameRate'], seed=iCam)
+        return openers, fakeu6
+    import u6
+    names = [d.decode() if isinstance(d, bytes) else d for d in ic.TIS_CAM().GetDevices()]
+    if len(names) < cfg['cameras']:
+        raise RuntimeError('{} cameras requested, {} attached'.format(cfg['cameras'], len(names)))
+    videoFormat = '{} ({}x{})'.format(cfg['sink'], width, height)
+    return {name: functools.partial(multicam.openTISCamera, name, videoFormat, cfg['frameRate'])
+            for name in names[:cfg['cameras']]}, u6
+
+
+def runMultiCam(cfg):
+    """ Run one synchronized acquisition with MultiCamRecorder and measure it.
+    Meant to run in its own process.
+
+    Args:
+        cfg: (dict) one point of the benchmark grid with 'cameras' set, see configGrid
+
+    Returns:
+        (dict) cfg plus the measurements: 'fps' is the aggregate over all cameras,
+        'perCamera' has each camera's frames, fps and drops.
+    """
+    import multicam
+    import tisgrabber as ic
+
+    openers, labjack = _multiCamOpeners(cfg)
+    with tempfile.TemporaryDirectory() as outdir:
+        with contextlib.redirect_stdout(io.StringIO()):
+            with multicam.MultiCamRecorder(openers, outdir, labjack=labjack, frameRate=cfg['frameRate'],
+                                           sinkFormat=ic.SinkFormats[cfg['sink']]) as rec:
+                t0 = time.perf_counter()
+                stacks, reports = rec.record(cfg['nFrames'], tuple(cfg['downscale']), 'bench',
+                                             returnReport=True, threaded=cfg['threaded'])
+                elapsed = time.perf_counter() - t0
+                del stacks
+        nBytes = sum(os.path.getsize(os.path.join(outdir, f)) for f in os.listdir(outdir))
+        timings = {name: np.load(glob.glob(os.path.join(outdir, 'bench_{}_*_timing.npy'.format(name)))[0])
+                   for name in openers}
+
+    perCamera = {}
+    for name, timing in timings.items():
+        timing = timing[timing['snapNs'] >= 0]
+        span = (timing['snapNs'][-1] - timing['snapNs'][0]) / 1e9 if len(timing) > 1 else 0.
+        perCamera[name] = {'frames': reports[name]['grab']['handled'],
+                           'dropped': reports[name]['grab']['dropped'],
+                           'fps': (len(timing) - 1) / span if span else 0.}
+    allTimings = list(timings.values())
+    result = dict(cfg)
+    result.update({
+        'elapsed': elapsed,
+        'fps': sum(c['frames'] for c in perCamera.values()) / elapsed,
+        'perCamera': perCamera,
+        'periodMs': _percentiles(np.concatenate([np.diff(t['snapNs']) for t in allTimings]) / 1e6),
+        'copyLatencyMs': _percentiles(np.concatenate([t['copyNs'] - t['snapNs'] for t in allTimings]) / 1e6),
+        'peakRSS': _peakRSS(),
+        'bytesWritten': nBytes,
+        'bytesPerSec': nBytes / elapsed,
+        'report': reports,
+    })
+    return result
+
+
+def configGrid(args):
+    """ Expand the command line sweep into a list of run configs. """
+    if args.cameras:
+        # synchronized trigger-mode runs; stacks always go through shared memory
+        grid = itertools.product(args.resolutions, args.sinks, args.downscales, args.frames)
+        return [{'camera': args.camera, 'frameRate': args.frameRate, 'threaded': args.threaded,
+                 'pupil': False, 'cameras': args.cameras,
+                 'resolution': res, 'sink': sink, 'downscale': ds, 'nFrames': nF,
+                 'writer': 'shm', 'mode': 'trigger'}
+                for res, sink, ds, nF in grid]
+    grid = itertools.product(args.resolutions, args.sinks, args.downscales, args.frames,
+                             args.writers, args.modes)
+    return [{'camera': args.camera, 'frameRate': args.frameRate, 'threaded': args.threaded,
+             'pupil': args.pupil,
+             'resolution': res, 'sink': sink, 'downscale': ds, 'nFrames': nF,
+             'writer': writer, 'mode': mode}
+            for res, sink, ds, nF, writer, mode in grid]
+
+
+def _runInSubprocess(cfg):
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--one', json.dumps(cfg)],
+                                  cwd=_HERE)
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def _key(r):
+    key = {k: r[k] for k in ('camera', 'resolution', 'sink', 'downscale', 'nFrames', 'writer', 'mode',
+                             'threaded')}
+    key['pupil'] = r.get('pupil', False)
+    key['cameras'] = r.get('cameras', 0)
+    return json.dumps(key, sort_keys=True)
+
+
+def compareResults(new, old, tolerance=0.1):
+    """ Flag runs that got slower than a previous results file.
+
+    Args:
+        new, old: (dict) benchmark results as written by main
+        tolerance: (float) allowed fractional loss in fps / growth in p99 period
+
+    Returns:
+        regressions: (list of str) one line per regressed metric.
+    """
+    regressions = []
+    oldRuns = {_key(r): r for r in old['runs']}
+    for r in new['runs']:
+        o = oldRuns.get(_key(r))
+        if o is None:
+            continue
+        if r['fps'] < o['fps'] * (1 - tolerance):
+            regressions.append('{}: fps {:.1f} -> {:.1f}'.format(_key(r), o['fps'], r['fps']))
+        if r['periodMs']['p99'] > o['periodMs']['p99'] * (1 + tolerance):
+            regressions.append('{}: p99 period {:.2f} -> {:.2f} ms'.format(
+                _key(r), o['periodMs']['p99'], r['periodMs']['p99']))
+    if new['importTime'] > old['importTime'] * (1 + tolerance):
+        regressions.append('import ICtools: {:.3f} -> {:.3f} s'.format(old['importTime'], new['importTime']))
+    return regressions
+
+
+def _parseArgs(argv):
+    def csv(conv):
+        return lambda s: [conv(x) for x in s.split(',')]
+
+    def dims(s):
+        return [int(x) for x in s.split('x')]
+
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--camera', choices=('sim', 'real'), default='sim')
+    p.add_argument('--frameRate', type=float, default=500.0,
+                   help='camera frame rate; high for the simulator, to find the pipeline limit')
+    p.add_argument('--resolutions', type=csv(dims), default=[[640, 480]], help='e.g. 640x480,1280x960')
+    p.add_argument('--sinks', type=csv(str), default=['Y800', 'Y16'],
+                   help='e.g. Y800,Y16,RGB24; Y16 against Y800 compares the 16 and 8 bit paths')
+    p.add_argument('--downscales', type=csv(dims), default=[[1, 2, 2]], help='z x y, e.g. 1x2x2,4x2x2')
+    p.add_argument('--frames', type=csv(int), default=[500])
+    p.add_argument('--writers', type=csv(str), default=['ram', 'memmap', 'stream'])
+    p.add_argument('--modes', type=csv(str), default=['snap', 'callback'])
+    p.add_argument('--threaded', action='store_true')
+    p.add_argument('--pupil', action='store_true', help='track the pupil online in every run')
+    p.add_argument('--cameras', type=int, default=0,
+                   help='record from this many cameras at once with MultiCamRecorder instead of the '
+                        'single camera grid; reports per camera and aggregate fps')
+    p.add_argument('--out', default='bench.json')
+    p.add_argument('--compare', help='previous results file to check for regressions')
+    p.add_argument('--tolerance', type=float, default=0.1)
+    p.add_argument('--check-imports', dest='checkImports', action='store_true',
+                   help='only check that importing ICtools stays lazy and cheap; exit 1 on failure')
+    p.add_argument('--importBudget', type=float, default=1.0, help='seconds allowed by --check-imports')
+    p.add_argument('--one', help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parseArgs(argv)
+    if args.one:
+        cfg = json.loads(args.one)
+        print(json.dumps(runMultiCam(cfg) if cfg.get('cameras') else runOne(cfg)))
+        return 0
+    if args.checkImports:
+        failures = checkImports(args.importBudget)
+        for line in failures:
+            print('IMPORT CHECK FAILED ' + line)
+        return 1 if failures else 0
+
+    results = {'commit': _gitCommit(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'python': sys.version.split()[0], 'importTime': importTime(), 'runs': []}
+    print('import ICtools: {:.3f} s'.format(results['importTime']))
+    if args.pupil:
+        results['pupilTiming'] = []
+        for res, ds in itertools.product(args.resolutions, args.downscales):
+            pt = pupilTiming(res, ds)
+            results['pupilTiming'].append(pt)
+            print('pupil {resolution} {downscale} -> {shape}: {mean:.2f} ms mean, p99 {p99:.2f} ms, '
+                  'up to {maxFps:.0f} fps on one core'.format(**dict(pt, **pt['processMs'])))
+    for cfg in configGrid(args):
+        r = _runInSubprocess(cfg)
+        results['runs'].append(r)
+        print('{resolution} {sink} {downscale} n={nFrames} {writer:6} {mode:8} '
+              '{fps:8.1f} fps  p99 {p99:6.2f} ms  peak {rss:6.0f} MB  {bps:6.1f} MB/s'.format(
+                  rss=(r['peakRSS'] or 0) / 2**20, bps=r['bytesPerSec'] / 2**20,
+                  p99=r['periodMs']['p99'], **r))
+        for name, c in sorted(r.get('perCamera', {}).items()):
+            print('    {:12} {:8.1f} fps  {} frames  {} dropped'.format(name, c['fps'], c['frames'], c['dropped']))
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=1)
+    print('Wrote {}'.format(args.out))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compareResults(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print('REGRESSION ' + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Cached camera property settings.
+
+setCameraParams used to issue every property call on every use. Here a params
+dict is first translated into device settings through PARAM_SCHEMA, then
+PropertyCache writes only the settings that differ from the last known device
+state, so re-applying an unchanged config costs no DLL calls at all.
+
+    props = camprops.propertyCache(cam)
+    report = props.apply(params)   # writes everything the first time
+    report = props.apply(params)   # writes nothing
+    params['gain'] = 8
+    report = props.apply(params)   # writes Gain Value only
+"""
+import collections
+import numbers
+import time
+
+
+# One device setting: property interface, property and element names as the DLL
+# knows them. kind is 'value' (Set/GetPropertyValue, int), 'switch'
+# (Set/GetPropertySwitch, 0 or 1) or 'absolute' (Set/GetPropertyAbsoluteValue, float).
+Setting = collections.namedtuple('Setting', ['kind', 'property', 'element'])
+
+# How one entry of a params dict maps onto the device.
+#   setting: the setting the value is written to
+#   auto: switch setting turned on when the value is 'auto' (and off otherwise),
+#       or None if 'auto' is not allowed
+#   skipIf: params key; when that param is true, the device sets this value itself
+#       and it is not written
+ParamSpec = collections.namedtuple('ParamSpec', ['setting', 'auto', 'skipIf'])
+
+
+def _spec(kind, prop, element, auto=None, skipIf=None):
+    return ParamSpec(Setting(kind, prop, element),
+                     Setting('switch', prop, auto) if auto is not None else None, skipIf)
+
+
+# our camera params, in the order they are applied
+PARAM_SCHEMA = collections.OrderedDict([
+    ('brightness', _spec('value', 'Brightness', 'Value')),
+    ('contrast', _spec('value', 'Contrast', 'Value')),
+    ('gain', _spec('value', 'Gain', 'Value', auto='Auto')),
+    ('exposure', _spec('absolute', 'Exposure', 'Value', auto='Auto')),
+    ('exposureAutoRef', _spec('value', 'Exposure', 'Auto Reference')),
+    # 'auto' is not supported: both auto exposure and auto max value auto are
+    # called "Auto", which causes problems
+    ('exposureAutoMax', _spec('absolute', 'Exposure', 'Auto Max Value')),
+    ('highlightReduction', _spec('switch', 'Highlight reduction', 'Enable')),
+    ('sharpness', _spec('value', 'Sharpness', 'Value')),
+    ('gamma', _spec('value', 'Gamma', 'Value')),
+    ('denoise', _spec('value', 'Denoise', 'Value')),
+    ('autoCenter', _spec('switch', 'Partial scan', 'Auto-center')),
+    ('xOffset', _spec('value', 'Partial scan', 'X Offset', skipIf='autoCenter')),
+    ('yOffset', _spec('value', 'Partial scan', 'Y Offset', skipIf='autoCenter')),
+    ('trigger', _spec('switch', 'Trigger', 'Enable')),
+    ('strobe', _spec('switch', 'Strobe', 'Enable')),
+    ('strobePolarity', _spec('switch', 'Strobe', 'Polarity')),
+    ('toneMapping', _spec('switch', 'Tone Mapping', 'Enable')),
+])
+
+
+def _convert(key, kind, value):
+    """ Check a param value against its setting kind and convert it for the DLL. """
+    if kind == 'switch':
+        if not isinstance(value, (bool, numbers.Integral)) or value not in (0, 1):
+            raise ValueError('%s must be a bool, got %r' % (key, value))
+        return int(value)
+    if kind == 'value':
+        if isinstance(value, bool) or not isinstance(value, numbers.Integral):
+            raise ValueError('%s must be an int, got %r' % (key, value))
+        return int(value)
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        raise ValueError('%s must be a number, got %r' % (key, value))
+    return float(value)
+
+
+def paramSettings(params):
+    """ Translate a params dict into device settings, checking it against PARAM_SCHEMA.
+
+    Args:
+        params: (dict) camera parameters, with every key of PARAM_SCHEMA
+
+    Returns:
+        settings: (list) (Setting, value) pairs in the order they should be written.
+        raises ValueError on missing or unknown keys, or a value of the wrong type.
+    """
+    missing = [k for k in PARAM_SCHEMA if k not in params]
+    unknown = [k for k in params if k not in PARAM_SCHEMA]
+    if missing or unknown:
+        raise ValueError('Bad camera params: missing %s, unknown %s' % (missing, unknown))
+    settings = []
+    for key, spec in PARAM_SCHEMA.items():
+        value = params[key]
+        if spec.skipIf is not None and params[spec.skipIf]:
+            continue
+        if spec.auto is not None:
+            isAuto = isinstance(value, str) and value == 'auto'
+            settings.append((spec.auto, int(isAuto)))
+            if isAuto:
+                continue
+        elif isinstance(value, str) and value == 'auto':
+            raise ValueError('%s cannot be auto, use a number' % key)
+        settings.append((spec.setting, _convert(key, spec.setting.kind, value)))
+    return settings
+
+
+def _isAutoSwitch(setting):
+    return setting.kind == 'switch' and setting.element in ('Auto', 'Auto-center')
+
+
+class PropertyCache(object):
+    """ Last known property state of one camera, written through on change.
+
+    The cache only knows what it wrote or read itself. Call invalidate() after
+    anything else changes the device: reopening it, loading a device state
+    file, or the property dialog.
+
+    Args:
+        cam: (TIS_CAM) opened camera object
+    """
+
+    def __init__(self, cam):
+        self.cam = cam
+        self.state = {}  # Setting -> value last written to or read from the device
+
+    def invalidate(self):
+        """ Forget the cached state, so the next apply writes everything. """
+        self.state.clear()
+
+    def assume(self, params):
+        """ Record params as the device state without writing anything, e.g. after
+        loading a device state file saved with these params applied.
+        """
+        self.invalidate()
+        self.state.update(paramSettings(params))
+
+    def _write(self, setting, value):
+        if setting.kind == 'value':
+            return self.cam.SetPropertyValue(setting.property, setting.element, value)
+        if setting.kind == 'switch':
+            return self.cam.SetPropertySwitch(setting.property, setting.element, value)
+        return self.cam.SetPropertyAbsoluteValue(setting.property, setting.element, value)
+
+    def read(self, setting):
+        """ Read one setting from the device and cache it.
+
+        Returns:
+            value of the setting.
+        """
+        if setting.kind == 'value':
+            value = self.cam.GetPropertyValue(setting.property, setting.element)
+        else:
+            box = [None]
+            if setting.kind == 'switch':
+                self.cam.GetPropertySwitch(setting.property, setting.element, box)
+            else:
+                self.cam.GetPropertyAbsoluteValue(setting.property, setting.element, box)
+            value = box[0]
+        self.state[setting] = value
+        return value
+
+    def set(self, setting, value, force=False):
+        """ Write one setting unless the device already has that value.
+
+        Args:
+            setting: (Setting) what to write
+            value: value to write
+            force: (bool) write even if the cached value matches
+
+        Returns:
+            seconds: (float) time spent in the DLL call, or None if nothing was written.
+            raises RuntimeError if the DLL call fails.
+        """
+        if not force and setting in self.state and self.state[setting] == value:
+            return None
+        t0 = time.perf_counter()
+        retval = self._write(setting, value)
+        seconds = time.perf_counter() - t0
+        if retval != 1:
+            # the device may be part way there; read it back on the next apply
+            self.state.pop(setting, None)
+            raise RuntimeError('Error setting %s %s to %r, retval %d' % (
+                setting.property, setting.element, value, retval))
+        self.state[setting] = value
+        if _isAutoSwitch(setting) and value:
+            # the camera now drives the other elements of this property itself
+            for s in [s for s in self.state if s.property == setting.property and s != setting]:
+                del self.state[s]
+        return seconds
+
+    def apply(self, params, force=False):
+        """ Bring the device to params, writing only settings that changed.
+
+        Args:
+            params: (dict) camera parameters, see PARAM_SCHEMA and paramSettings
+            force: (bool) write every setting regardless of the cache
+
+        Returns:
+            report: (dict) 'written': list of (property, element, value, seconds) per
+                DLL call, 'skipped': number of settings already in place, 'time':
+                total seconds.
+        """
+        settings = paramSettings(params)
+        t0 = time.perf_counter()
+        written = []
+        for setting, value in settings:
+            seconds = self.set(setting, value, force)
+            if seconds is not None:
+                written.append((setting.property, setting.element, value, seconds))
+        return {'written': written, 'skipped': len(settings) - len(written),
+                'time': time.perf_counter() - t0}
+
+
+def propertyCache(cam):
+    """ The PropertyCache of a camera object, created on first use.
+
+    Args:
+        cam: (TIS_CAM) opened camera object
+
+    Returns:
+        (PropertyCache) the same object on every call for the same camera.
+    """
+    cache = getattr(cam, '_propertyCache', None)
+    if cache is None:
+        cache = PropertyCache(cam)
+        cam._propertyCache = cache
+    return cache
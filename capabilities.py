@@ -0,0 +1,209 @@
+"""
+Cached camera capabilities, for checking configs without going to the device.
+
+Enumerating video formats, frame rates and property ranges is a round of DLL
+(and USB) calls per item. CapabilityCache does it once per device, keyed by the
+device's unique name, and can keep the results in a JSON file across sessions.
+Nothing is re-read until invalidate() is called, e.g. after a camera is
+plugged in or swapped, or its firmware changed.
+
+    caps = capabilities.CapabilityCache('capabilities.json')
+    problems = caps.validate(cam, params, 'Y800 (640x480)', 15.0)
+"""
+import json
+import os
+import time
+
+import camprops
+
+
+def _text(name):
+    return name.decode('utf-8') if isinstance(name, bytes) else name
+
+
+def _propertyKey(setting):
+    return '{}: {}'.format(setting.property, setting.element)
+
+
+def _currentVideoFormat(cam, videoFormats):
+    """ Name of the camera's current video format among videoFormats, from its
+    image size and sink, or None if that doesn't pin it down.
+    """
+    width, height = cam.GetImageDescription()[:2]
+    size = '({}x{})'.format(width, height)
+    name = '{} {}'.format(cam.GetFormat().name, size)
+    if name in videoFormats:
+        return name
+    sameSize = [f for f in videoFormats if f.endswith(size)]
+    return sameSize[0] if len(sameSize) == 1 else None
+
+
+def _inRange(value, lo, hi):
+    # absolute value ranges come back as C floats
+    slack = 1e-6 * max(abs(lo), abs(hi))
+    return lo - slack <= value <= hi + slack
+
+
+class CapabilityCache(object):
+    """ Formats, frame rates and property ranges per device.
+
+    Args:
+        path: (str) JSON file to load the cache from and save it to after every
+            query, or None to keep it in memory only
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.devices = {}  # unique name -> capabilities dict, see query
+        self.deviceNames = None  # attached devices, see listDevices
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.devices = json.load(f)
+
+    def save(self):
+        """ Write the cache to path, if there is one. """
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.devices, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def invalidate(self, uniqueName=None):
+        """ Forget one device, or everything (including the device list) if uniqueName is None. """
+        if uniqueName is None:
+            self.devices.clear()
+            self.deviceNames = None
+        else:
+            self.devices.pop(uniqueName, None)
+        self.save()
+
+    def listDevices(self, cam, refresh=False):
+        """ Unique names of the attached devices, enumerated once.
+
+        Args:
+            cam: (TIS_CAM) any camera object
+            refresh: (bool) enumerate again, e.g. after a hot-plug
+
+        Returns:
+            (list of str) device unique names.
+        """
+        if self.deviceNames is None or refresh:
+            self.deviceNames = [_text(d) for d in cam.GetDevices()]
+        return self.deviceNames
+
+    def query(self, cam):
+        """ Read the capabilities of the open device from the DLL and cache them.
+
+        Args:
+            cam: (TIS_CAM) opened camera object
+
+        Returns:
+            caps: (dict) 'videoFormats': list of format names, 'frameRates':
+                {video format: list of fps} for formats looked up with frameRates,
+                'properties': {'Property: Element': {'available': bool, 'range':
+                [min, max] or None}} for every setting in camprops.PARAM_SCHEMA, and
+                'queried', the time of the query.
+        """
+        uniqueName = cam.GetUniqueName()
+        properties = {}
+        for spec in camprops.PARAM_SCHEMA.values():
+            for setting in (spec.setting, spec.auto):
+                if setting is None:
+                    continue
+                available = cam.IsPropertyAvailable(setting.property, setting.element) == 1
+                valueRange = None
+                if available and setting.kind != 'switch':
+                    box = [None, None]
+                    if setting.kind == 'value':
+                        retval = cam.GetPropertyValueRange(setting.property, setting.element, box)
+                    else:
+                        retval = cam.GetPropertyAbsoluteValueRange(setting.property, setting.element, box)
+                    if retval == 1:
+                        valueRange = list(box)
+                properties[_propertyKey(setting)] = {'available': available, 'range': valueRange}
+        caps = {'videoFormats': [_text(f) for f in cam.GetVideoFormats()],
+                'frameRates': {},
+                'properties': properties,
+                'queried': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self.devices[uniqueName] = caps
+        self.save()
+        return caps
+
+    def get(self, cam):
+        """ Cached capabilities of the open device, queried on first use. See query. """
+        caps = self.devices.get(cam.GetUniqueName())
+        if caps is None:
+            caps = self.query(cam)
+        return caps
+
+    def frameRates(self, cam, videoFormat):
+        """ Frame rates of one video format, cached.
+
+        The driver only lists the frame rates of the current format, so on a cache
+        miss videoFormat is set on the camera for the lookup, and the previous
+        format, sink and frame rate are set again after it. The camera must not
+        be live then. If the current format can't be told from the image size
+        and sink, the camera is left alone and nothing is looked up.
+
+        Args:
+            cam: (TIS_CAM) opened camera object
+            videoFormat: (str) e.g. 'Y800 (640x480)'
+
+        Returns:
+            (list of float) available frame rates, empty if the format was refused,
+            or None if they aren't cached and could not be looked up.
+            raises RuntimeError if the previous format can't be set again.
+        """
+        caps = self.get(cam)
+        if videoFormat not in caps['frameRates']:
+            previous = _currentVideoFormat(cam, caps['videoFormats'])
+            if previous is None:
+                return None
+            if previous == videoFormat:
+                rates = cam.GetAvailableFrameRates()
+            else:
+                sink, frameRate = cam.GetFormat(), cam.GetFrameRate()
+                rates = cam.GetAvailableFrameRates() if cam.SetVideoFormat(videoFormat) == 1 else []
+                if cam.SetVideoFormat(previous) != 1:
+                    raise RuntimeError('Could not set video format {} again'.format(previous))
+                cam.SetFormat(sink)
+                cam.SetFrameRate(frameRate)
+            caps['frameRates'][videoFormat] = rates
+            self.save()
+        return caps['frameRates'][videoFormat]
+
+    def validate(self, cam, params=None, videoFormat=None, frameRate=None):
+        """ Check a camera config against the cached capabilities.
+
+        Args:
+            cam: (TIS_CAM) opened camera object
+            params: (dict) camera parameters, see camprops.PARAM_SCHEMA, or None
+            videoFormat: (str) video format, or None
+            frameRate: (float) frame rate in videoFormat, or None
+
+        Returns:
+            problems: (list of str) one line per problem; empty if the config is fine.
+            raises ValueError if params don't match the schema.
+            Frame rates not yet cached are looked up without changing the camera's
+            format, see frameRates.
+        """
+        caps = self.get(cam)
+        problems = []
+        if videoFormat is not None:
+            if videoFormat not in caps['videoFormats']:
+                problems.append('video format {} not available'.format(videoFormat))
+            elif frameRate is not None:
+                rates = self.frameRates(cam, videoFormat)
+                if rates is None:
+                    problems.append('frame rates for {} not cached'.format(videoFormat))
+                elif not any(abs(frameRate - r) <= 1e-3 * r for r in rates):
+                    problems.append('{} fps not available in {} (have {})'.format(frameRate, videoFormat, rates))
+        if params is not None:
+            for setting, value in camprops.paramSettings(params):
+                prop = caps['properties'].get(_propertyKey(setting))
+                if prop is None or not prop['available']:
+                    problems.append('{} not available'.format(_propertyKey(setting)))
+                elif prop['range'] is not None and not _inRange(value, *prop['range']):
+                    problems.append('{} = {} out of range {}'.format(_propertyKey(setting), value, prop['range']))
+        return problems
@@ -0,0 +1,164 @@
+"""
+Stand-in for the LabJackPython u6 module, for running ICtools without a LabJack.
+
+Pass the module where ICtools takes a LabJack driver, e.g.
+    import fakeu6
+    ICtools.acquireStack(cam, ..., labjack=fakeu6)
+
+The fake device records every getFeedback call with a perf_counter timestamp,
+so tests and benchmarks can check what would have been sent to the hardware.
+
+Timer 0 in frequency output mode (TimerMode 7) is simulated too: objects
+passed to connectTrigger (e.g. a simcam.SimCam) get trigger() called on each
+rising edge, as if cabled to the timer pin. A TriggerLine carries the edges to
+a camera in another process.
+"""
+import collections
+import multiprocessing
+import threading
+import time
+
+
+# feedback commands, with the same argument names as u6
+BitDirWrite = collections.namedtuple('BitDirWrite', ['IONumber', 'Direction'])
+BitStateWrite = collections.namedtuple('BitStateWrite', ['IONumber', 'State'])
+WaitShort = collections.namedtuple('WaitShort', ['Time'])  # units of 64 us on the U6
+Timer0Config = collections.namedtuple('Timer0Config', ['TimerMode', 'Value'])
+DAC0_16 = collections.namedtuple('DAC0_16', ['Value'])
+DAC1_16 = collections.namedtuple('DAC1_16', ['Value'])
+
+# timer clock bases in Hz, as the low-level ConfigTimerClock codes of the U6
+# (User's Guide 5.2.4): 0-2 run undivided, 3-6 take a divisor
+_TIMER_CLOCKS = {0: 4e6, 1: 12e6, 2: 48e6, 3: 1e6, 4: 4e6, 5: 12e6, 6: 48e6}
+
+_triggerTargets = []
+
+
+def connectTrigger(target):
+    """ Cable target's trigger input to the timer output of every fake U6. """
+    _triggerTargets.append(target)
+
+
+def disconnectTriggers():
+    del _triggerTargets[:]
+
+
+class TriggerLine(object):
+    """ Trigger wire from a fake U6 in this process to a camera in another one.
+
+    Pass it to connectTrigger here, and to the other process, where connect(cam)
+    forwards each edge, with its original perf_counter time, to cam.trigger.
+    Connect one process per line, for the life of the line: a receiver that
+    exits can leave the line locked.
+
+    Args:
+        ctx: (multiprocessing context) context the other process is started with
+    """
+
+    def __init__(self, ctx=None):
+        ctx = ctx or multiprocessing.get_context('spawn')
+        self._edges = ctx.Queue()
+
+    def trigger(self):
+        self._edges.put(time.perf_counter())
+
+    def connect(self, target):
+        """ In the receiving process: call target.trigger(t) for every edge. """
+        def forward():
+            while True:
+                target.trigger(self._edges.get())
+        threading.Thread(target=forward, name='fakeu6-trigger-line', daemon=True).start()
+
+
+class U6(object):
+    """ Fake U6 device.
+
+    Args:
+        latency: (float) seconds each getFeedback call blocks, on top of any WaitShort
+            in the packet (a real USB round-trip is a few ms)
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.feedbackCalls = []  # (perf_counter time, commands) per getFeedback call
+        self.doState = {}
+        self.dacState = {}  # DAC number -> last 16 bit value
+        self.configured = False
+        self.nTimersEnabled = 0
+        self.timerClock = (2, 0)  # 48 MHz, the power-up default
+        self._clockThread = None
+        self._clockStop = threading.Event()
+
+    def configU6(self, **kwargs):
+        self.configured = True
+        return {}
+
+    def configIO(self, NumberTimersEnabled=None, TimerCounterPinOffset=None, **kwargs):
+        if NumberTimersEnabled is not None:
+            self.nTimersEnabled = NumberTimersEnabled
+            if NumberTimersEnabled == 0:
+                self._stopClock()
+        return {}
+
+    def configTimerClock(self, TimerClockBase=None, TimerClockDivisor=None):
+        if TimerClockBase not in _TIMER_CLOCKS:
+            raise ValueError('Invalid TimerClockBase %r, the U6 takes 0-6' % (TimerClockBase,))
+        self.timerClock = (TimerClockBase, TimerClockDivisor)
+        return {}
+
+    def _startClock(self, value):
+        clockBase, divisor = self.timerClock
+        if clockBase < 3:
+            divisor = 1  # these bases ignore the divisor
+        period = 2. * (divisor or 256) * (value or 256) / _TIMER_CLOCKS[clockBase]
+        self._stopClock()
+        self._clockStop.clear()
+        self._clockThread = threading.Thread(target=self._runClock, args=(period,),
+                                             name='fakeu6-timer0', daemon=True)
+        self._clockThread.start()
+
+    def _runClock(self, period):
+        tNext = time.perf_counter() + period
+        while not self._clockStop.is_set():
+            delay = tNext - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            for target in _triggerTargets:
+                target.trigger()
+            tNext += period
+
+    def _stopClock(self):
+        if self._clockThread is not None:
+            self._clockStop.set()
+            self._clockThread.join()
+            self._clockThread = None
+
+    def getCalibrationData(self):
+        return {}
+
+    def voltageToDACBits(self, volts, dacNumber=0, is16Bits=False):
+        # an ideal, uncalibrated 0-5 V DAC
+        full = 65535 if is16Bits else 255
+        return int(min(max(round(volts / 5. * full), 0), full))
+
+    def setDOState(self, ioNum, state=1):
+        self.doState[ioNum] = state
+
+    def getFeedback(self, *commandlist):
+        self.feedbackCalls.append((time.perf_counter(), commandlist))
+        waitTime = self.latency
+        for cmd in commandlist:
+            if isinstance(cmd, WaitShort):
+                waitTime += cmd.Time * 64e-6
+            elif isinstance(cmd, BitStateWrite):
+                self.doState[cmd.IONumber] = cmd.State
+            elif isinstance(cmd, (DAC0_16, DAC1_16)):
+                self.dacState[0 if isinstance(cmd, DAC0_16) else 1] = cmd.Value
+            elif isinstance(cmd, Timer0Config) and self.nTimersEnabled and cmd.TimerMode == 7:
+                self._startClock(cmd.Value)
+        if waitTime > 0:
+            time.sleep(waitTime)
+        return [None] * len(commandlist)
+
+    def close(self):
+        self._stopClock()
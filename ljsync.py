@@ -0,0 +1,472 @@
+"""
+LabJack U6 sync signals for camera acquisition.
+
+TTLSync issues the per-frame TTL pulse from its own thread, so the grab loop
+only records a request and never waits on a USB round-trip. Every pulse keeps
+perf_counter_ns timestamps for when it was requested, sent and acknowledged.
+
+HardwareClock instead runs a U6 timer as a free-running frame clock, for
+cameras in trigger mode.
+
+MetricOutput closes the loop: it writes a per-frame measurement (e.g. pupil
+area) to a DAC or a digital line as soon as it is known, and times every write
+against the frame's arrival.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+def openU6(labjack=None, dioPortNum=0):
+    """ Open and configure a U6 for TTL output.
+
+    Args:
+        labjack: (module) LabJack driver module: u6, or fakeu6 to run without hardware.
+            None means u6.
+        dioPortNum: (int) FIO line for the TTL
+
+    Returns:
+        labjack: (module) the driver module actually used
+        u6Obj: (U6) opened device, TTL line low
+    """
+    if labjack is None:
+        try:
+            import u6 as labjack
+        except ImportError:
+            raise ImportError('LabJackPython (u6) is not installed; pass labjack=fakeu6 to run without a LabJack.')
+    u6Obj = labjack.U6()
+    u6Obj.configU6()
+    u6Obj.configIO()
+    u6Obj.setDOState(dioPortNum, state=0)
+    return labjack, u6Obj
+
+
+def deviceLock(u6Obj):
+    """ Lock serializing getFeedback calls on one device from several threads
+    (e.g. TTLSync and MetricOutput), created on first use.
+
+    Args:
+        u6Obj: (U6) opened device
+
+    Returns:
+        (threading.Lock) the same lock on every call for the same device.
+    """
+    lock = getattr(u6Obj, '_feedbackLock', None)
+    if lock is None:
+        lock = threading.Lock()
+        u6Obj._feedbackLock = lock
+    return lock
+
+
+class TTLSync(object):
+    """ Per-frame TTL pulses on one U6 digital line.
+
+    The line direction is set once and the pulse packet (high, wait, low) is
+    built once, so each pulse is a single getFeedback call. With threaded=True
+    the calls run on a dedicated thread and pulse() returns immediately;
+    pulses requested while the thread is busy are sent back to back, in order.
+
+    Args:
+        labjack: (module) LabJack driver module, see openU6
+        dioPortNum: (int) FIO line, FIO0 by default
+        pulseLengthTicks: (int) pulse width in WaitShort ticks (64 us on the U6)
+        threaded: (bool) send pulses from a background thread
+        u6Obj: (U6) already opened device to use instead of opening one
+        nPulses: (int) pulses to preallocate timestamps for, e.g. the trial's frame
+            count; more are stored in further blocks of this size
+    """
+
+    def __init__(self, labjack=None, dioPortNum=0, pulseLengthTicks=int(1000/64), threaded=True,
+                 u6Obj=None, nPulses=4096):
+        if u6Obj is None:
+            labjack, u6Obj = openU6(labjack, dioPortNum)
+        self.labjack = labjack
+        self.u6Obj = u6Obj
+        self.dioPortNum = dioPortNum
+        self.threaded = threaded
+        self._lock = deviceLock(u6Obj)
+        u6Obj.getFeedback(labjack.BitDirWrite(dioPortNum, 1))
+        self._packet = (labjack.BitStateWrite(dioPortNum, State=1),
+                        labjack.WaitShort(pulseLengthTicks),
+                        labjack.BitStateWrite(dioPortNum, State=0))
+        # timestamps in (3, nPulses) int64 blocks: rows requestNs, issueNs, doneNs.
+        # Blocks are only ever added, so the thread can write while pulse() grows them.
+        self._blockSize = max(1, nPulses)
+        self._blocks = [np.full((3, self._blockSize), -1, dtype=np.int64)]
+        self._nRequested = 0
+        self._nIssued = 0
+        self._nDone = 0
+        self._error = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, name='TTLSync', daemon=True)
+            self._thread.start()
+
+    def _stamp(self, row, iPulse):
+        self._blocks[iPulse // self._blockSize][row, iPulse % self._blockSize] = time.perf_counter_ns()
+
+    def _send(self):
+        iPulse = self._nIssued
+        with self._lock:
+            self._stamp(1, iPulse)
+            self._nIssued = iPulse + 1
+            self.u6Obj.getFeedback(*self._packet)
+        self._stamp(2, iPulse)
+        self._nDone = iPulse + 1
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closed or self._nIssued < self._nRequested)
+                    if self._nIssued == self._nRequested:
+                        return
+                self._send()
+        except Exception as e:
+            self._error = e
+
+    def pulse(self):
+        """ Request one TTL pulse.
+
+        Returns:
+            iPulse: (int) index of the pulse in the timestamp arrays.
+        """
+        if self._error is not None:
+            raise RuntimeError('TTL thread failed: %s' % self._error)
+        with self._cond:
+            iPulse = self._nRequested
+            if iPulse == len(self._blocks) * self._blockSize:
+                self._blocks.append(np.full((3, self._blockSize), -1, dtype=np.int64))
+            self._stamp(0, iPulse)
+            self._nRequested = iPulse + 1
+            self._cond.notify()
+        if not self.threaded:
+            self._send()
+        return iPulse
+
+    def close(self):
+        """ Send any pending pulses and stop the thread. The device stays open. """
+        if self._thread is not None:
+            with self._cond:
+                self._closed = True
+                self._cond.notify()
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError('TTL thread failed: %s' % self._error)
+
+    def timestamps(self):
+        """ Pulse timestamps so far.
+
+        Returns:
+            (dict) perf_counter_ns arrays 'requestNs' (pulse() called), 'issueNs'
+            (getFeedback started) and 'doneNs' (getFeedback returned), one entry
+            per pulse sent.
+        """
+        n = self._nDone
+        times = np.concatenate(self._blocks[:-(-n // self._blockSize) or 1], axis=1)[:, :n]
+        return {'requestNs': times[0], 'issueNs': times[1], 'doneNs': times[2]}
+
+    def report(self):
+        """ Pulse count and how long pulses waited for the USB call to start. """
+        ts = self.timestamps()
+        lagMs = (ts['issueNs'] - ts['requestNs']) / 1e6
+        return {'handled': len(lagMs),
+                'issueLagMs': {'mean': float(lagMs.mean()) if len(lagMs) else 0.,
+                               'max': float(lagMs.max()) if len(lagMs) else 0.}}
+
+
+# U6 timer clock bases that take a divisor, in Hz. These are the low-level
+# ConfigTimerClock codes (U6 User's Guide 5.2.4) that u6.configTimerClock sends,
+# 0-6 and masked with & 7, not the UD driver's LJ_tc... constants (20-26).
+_TIMER_CLOCKS = {3: 1e6, 4: 4e6, 5: 12e6, 6: 48e6}
+
+
+def timerSettings(frameRate):
+    """ Pick the U6 timer clock and divisor for a frequency-output clock.
+
+    In frequency output mode (TimerMode 7) the U6 outputs a square wave at
+    clock / (2 * divisor * value), with divisor and value in 1-256.
+
+    Args:
+        frameRate: (float) requested frequency in Hz
+
+    Returns:
+        clockBase, divisor, value: (int) U6 settings
+        actualRate: (float) frequency they produce
+    """
+    best = None
+    for clockBase, clock in sorted(_TIMER_CLOCKS.items()):
+        for divisor in range(1, 257):
+            value = int(round(clock / (2. * divisor * frameRate)))
+            if not 1 <= value <= 256:
+                continue
+            rate = clock / (2. * divisor * value)
+            if best is None or abs(rate - frameRate) < abs(best[3] - frameRate):
+                best = (clockBase, divisor, value, rate)
+    if best is None:
+        raise ValueError('Cannot make a %.3f Hz clock with a U6 timer' % frameRate)
+    return best
+
+
+class HardwareClock(object):
+    """ Frame clock from U6 timer 0 in frequency output mode.
+
+    The timer is routed to dioPortNum, the same line as the per-frame TTL, so
+    one wire can trigger the camera and mark frames for the recording system.
+    Rising edges are nominally at startNs + k * period; the camera exposes on
+    each edge once its Trigger switch is enabled.
+
+    Args:
+        labjack: (module) LabJack driver module, see openU6
+        dioPortNum: (int) FIO line for the clock
+        frameRate: (float) requested frame rate in Hz, see timerSettings
+        u6Obj: (U6) already opened device to use instead of opening one
+    """
+
+    def __init__(self, labjack=None, dioPortNum=0, frameRate=15.0, u6Obj=None):
+        if u6Obj is None:
+            labjack, u6Obj = openU6(labjack, dioPortNum)
+        self.labjack = labjack
+        self.u6Obj = u6Obj
+        self.dioPortNum = dioPortNum
+        self.clockBase, self.divisor, self.value, self.frameRate = timerSettings(frameRate)
+        self.startNs = None
+        self.stopNs = None
+
+    def start(self):
+        """ Start the clock. """
+        with deviceLock(self.u6Obj):
+            self.u6Obj.configIO(NumberTimersEnabled=1, TimerCounterPinOffset=self.dioPortNum)
+            # 256 is written as 0 for both divisor and value
+            self.u6Obj.configTimerClock(TimerClockBase=self.clockBase, TimerClockDivisor=self.divisor % 256)
+            t0 = time.perf_counter_ns()
+            self.u6Obj.getFeedback(self.labjack.Timer0Config(TimerMode=7, Value=self.value % 256))
+            self.startNs = (t0 + time.perf_counter_ns()) // 2
+        self.stopNs = None
+
+    def stop(self):
+        """ Stop the clock and leave the line low. """
+        with deviceLock(self.u6Obj):
+            self.u6Obj.configIO(NumberTimersEnabled=0, TimerCounterPinOffset=self.dioPortNum)
+            self.stopNs = time.perf_counter_ns()
+            self.u6Obj.setDOState(self.dioPortNum, state=0)
+
+    @property
+    def periodNs(self):
+        return 1e9 / self.frameRate
+
+    def pulseTimes(self):
+        """ Nominal rising-edge times (perf_counter_ns) between start and stop. """
+        stopNs = self.stopNs if self.stopNs is not None else time.perf_counter_ns()
+        nPulses = int((stopNs - self.startNs) // self.periodNs)
+        return self.startNs + (np.arange(nPulses) * self.periodNs).astype(np.int64)
+
+    def report(self):
+        return {'handled': len(self.pulseTimes()), 'frameRate': self.frameRate}
+
+    def close(self):
+        """ Stop the clock if it is running. The device stays open. """
+        if self.startNs is not None and self.stopNs is None:
+            self.stop()
+
+
+# one row per metric value passed to MetricOutput.write; -1 / NaN where not applicable
+OUTPUT_DTYPE = np.dtype([('snapNs', np.int64),     # frame handed over by the driver
+                         ('requestNs', np.int64),  # write() called, metric known
+                         ('issueNs', np.int64),    # getFeedback started; -1 if superseded
+                         ('doneNs', np.int64),     # getFeedback returned; -1 if superseded
+                         ('value', np.float64),    # the metric
+                         ('level', np.float64)])   # volts on the DAC, or 0/1 on the line
+
+
+class MetricOutput(object):
+    """ Closed-loop output of a per-frame metric on the U6.
+
+    Either an analog level on DAC0/DAC1, the metric mapped linearly from
+    valueRange onto voltRange (and clipped), or a digital line set high while
+    the metric is above threshold. Each value is written as one getFeedback
+    call. With threaded=False every value is written. With threaded=True the
+    calls run on a dedicated thread and write() returns at once; a value that
+    arrives while the previous call is still on the USB supersedes any value
+    still waiting, which is then never written. So the output lags the newest
+    frame by at most about two USB round-trips instead of a growing backlog.
+
+    Every value is logged with the frame's arrival time, so the frame-to-output
+    latency can be checked, see report(). Superseded values keep their row,
+    with issueNs and doneNs -1.
+
+    Args:
+        field: (str) pupil.PUPIL_DTYPE field to output, e.g. 'area' or 'major'
+        dac: (int) 0 or 1 for analog output on that DAC, or None
+        dioPortNum: (int) FIO line for digital output, or None; not the TTL line
+        valueRange: (tuple) metric values mapped to voltRange
+        voltRange: (tuple) DAC volts, within 0-5
+        threshold: (float) for digital output, line high when the metric is above it
+        threaded: (bool) write from a background thread
+    """
+
+    def __init__(self, field='area', dac=None, dioPortNum=None, valueRange=(0., 1.),
+                 voltRange=(0., 5.), threshold=None, threaded=True):
+        if (dac is None) == (dioPortNum is None):
+            raise ValueError('Give exactly one of dac and dioPortNum')
+        if dac is not None and dac not in (0, 1):
+            raise ValueError('dac must be 0 or 1, got %r' % dac)
+        if dioPortNum is not None and threshold is None:
+            raise ValueError('Digital output needs a threshold')
+        self.field = field
+        self.dac = dac
+        self.dioPortNum = dioPortNum
+        self.valueRange = valueRange
+        self.voltRange = voltRange
+        self.threshold = threshold
+        self.threaded = threaded
+        self.labjack = None
+        self.u6Obj = None
+        self._log = None
+        self._n = 0
+        self._pending = None
+        self._error = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def open(self, labjack, u6Obj):
+        """ Set up the output on an opened device, level 0.
+
+        Args:
+            labjack: (module) LabJack driver module, see openU6
+            u6Obj: (U6) opened device, e.g. the one an AcquisitionSession uses for its TTL
+        """
+        self.labjack = labjack
+        self.u6Obj = u6Obj
+        self._lock = deviceLock(u6Obj)
+        with self._lock:
+            if self.dac is not None:
+                u6Obj.getCalibrationData()  # for voltageToDACBits
+            else:
+                u6Obj.getFeedback(labjack.BitDirWrite(self.dioPortNum, 1))
+        self._write(0.)
+
+    def _level(self, value):
+        if self.dac is None:
+            return float(value > self.threshold)
+        v0, v1 = self.valueRange
+        lo, hi = self.voltRange
+        return float(np.clip(lo + (value - v0) * (hi - lo) / (v1 - v0), min(lo, hi), max(lo, hi)))
+
+    def _write(self, level):
+        if self.dac is None:
+            cmd = self.labjack.BitStateWrite(self.dioPortNum, int(level))
+        else:
+            bits = self.u6Obj.voltageToDACBits(level, dacNumber=self.dac, is16Bits=True)
+            cmd = getattr(self.labjack, 'DAC%d_16' % self.dac)(bits)
+        with self._lock:
+            issueNs = time.perf_counter_ns()
+            self.u6Obj.getFeedback(cmd)
+        return issueNs, time.perf_counter_ns()
+
+    def _send(self, i):
+        row = self._log[i:i + 1]
+        row['issueNs'], row['doneNs'] = self._write(row['level'][0])
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._closed or self._pending is not None)
+                    i, self._pending = self._pending, None
+                    if i is None:
+                        return
+                self._send(i)
+        except Exception as e:
+            self._error = e
+
+    def start(self, nValues):
+        """ Start logging, and the output thread, for up to nValues writes. """
+        self.stop()
+        self._log = np.full(nValues, -1, dtype=OUTPUT_DTYPE)
+        self._log['value'] = self._log['level'] = np.nan
+        self._n = 0
+        self._error = None
+        if self.threaded:
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name='MetricOutput', daemon=True)
+            self._thread.start()
+
+    def write(self, value, snapNs=-1):
+        """ Output the metric of one frame.
+
+        Args:
+            value: (float) the metric
+            snapNs: (int) perf_counter_ns when the frame arrived, for the latency log
+        """
+        if self._error is not None:
+            raise RuntimeError('Output thread failed: %s' % self._error)
+        i = self._n
+        self._n += 1
+        row = self._log[i:i + 1]
+        row['requestNs'] = time.perf_counter_ns()
+        row['snapNs'], row['value'], row['level'] = snapNs, value, self._level(value)
+        if not self.threaded:
+            self._send(i)
+            return
+        with self._cond:
+            self._pending = i  # a value still waiting is superseded
+            self._cond.notify()
+
+    def stop(self):
+        """ Send any pending value and stop the thread. The output keeps its level.
+
+        Returns:
+            log: (np.ndarray) OUTPUT_DTYPE row per write() since start.
+        """
+        if self._thread is not None:
+            with self._cond:
+                self._closed = True
+                self._cond.notify()
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError('Output thread failed: %s' % self._error)
+        return self._log[:self._n] if self._log is not None else None
+
+    def close(self):
+        """ Stop, and return the output to level 0. The device stays open. """
+        self.stop()
+        if self.u6Obj is not None:
+            self._write(0.)
+            self.u6Obj = None
+
+    @staticmethod
+    def report(log, periodNs=None):
+        """ Frame-to-output latency of a write log.
+
+        Args:
+            log: (np.ndarray) from stop()
+            periodNs: (float) camera frame period, to count writes later than one frame
+
+        Returns:
+            (dict) 'written', 'superseded' (values replaced before being sent),
+            'latencyMs' (frame arrival to getFeedback returned: mean, p50, p99, max),
+            'computeMs' (frame arrival to write() called, mean and max), and
+            'overPeriod', writes that finished more than periodNs after their frame.
+        """
+        sent = log[(log['doneNs'] >= 0) & (log['snapNs'] >= 0)]
+        latencyMs = (sent['doneNs'] - sent['snapNs']) / 1e6
+        computeMs = (sent['requestNs'] - sent['snapNs']) / 1e6
+        report = {'written': int((log['doneNs'] >= 0).sum()),
+                  'superseded': int((log['doneNs'] < 0).sum()),
+                  'latencyMs': None, 'computeMs': None, 'overPeriod': None}
+        if len(sent):
+            report['latencyMs'] = {'mean': float(latencyMs.mean()),
+                                   'p50': float(np.percentile(latencyMs, 50)),
+                                   'p99': float(np.percentile(latencyMs, 99)),
+                                   'max': float(latencyMs.max())}
+            report['computeMs'] = {'mean': float(computeMs.mean()), 'max': float(computeMs.max())}
+            if periodNs is not None:
+                report['overPeriod'] = int((latencyMs > periodNs / 1e6).sum())
+        return report
@@ -0,0 +1,327 @@
+"""
+Synchronized acquisition from several cameras, one process per camera.
+
+Each camera runs its own AcquisitionSession (grab, bin, write) in a worker
+process, so per-frame work on one camera never waits on another's GIL. The
+parent owns the only LabJack and runs its timer as a common frame clock for
+all cameras, which acquire in 'trigger' mode; every camera's timing file maps
+its frames onto the same clock edges. Stacks come back through shared memory
+without being pickled.
+
+Cameras are given as picklable functions that open and configure one camera
+inside its worker process, e.g. functools.partial(multicam.openTISCamera,
+'DMK 72BUC02 7610448'), or simcam.openConnected with a fakeu6.TriggerLine.
+
+    with multicam.MultiCamRecorder({'eyeL': openL, 'eyeR': openR, 'body': openB},
+                                   outdir, labjack=u6, frameRate=30.0) as rec:
+        for iTrial in range(100):
+            stacks = rec.record(90, (1, 2, 2), 'mouse1_trial%03d' % iTrial)
+"""
+import multiprocessing
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import ljsync
+
+
+def openTISCamera(uniqueName, videoFormat='Y800 (640x480)', frameRate=15.0, params=None):
+    """ Open and configure a TIS camera; for use as a MultiCamRecorder camera.
+
+    Args:
+        uniqueName: (str) device unique name, e.g. 'DMK 72BUC02 7610448'
+        videoFormat: (str) video format
+        frameRate: (float) nominal frame rate; the exposure is triggered by the clock
+        params: (dict) camera parameters for ICtools.setCameraParams, or None
+
+    Returns:
+        cam: (TIS_CAM) opened camera.
+    """
+    import ICtools
+    import tisgrabber as ic
+    cam = ic.TIS_CAM()
+    ICtools._set_and_check(cam.open, uniqueName)
+    ICtools._set_and_check(cam.SetVideoFormat, videoFormat)
+    ICtools._set_and_check(cam.SetFrameRate, frameRate)
+    if params is not None:
+        ICtools.setCameraParams(cam, params)
+    return cam
+
+
+class _SharedClock(ljsync.HardwareClock):
+    """ A camera worker's view of the parent's HardwareClock.
+
+    start() tells the parent this camera is ready for frames and waits for the
+    clock to start; edge times come from the parent's start and stop times in
+    shared memory, so pulseTimes() is the parent's edge list.
+    """
+
+    def __init__(self, frameRate, ready, go, startNs, stopNs, timeout=10.0):
+        self.frameRate = frameRate
+        self._ready = ready
+        self._go = go
+        self._startNs = startNs
+        self._stopNs = stopNs
+        self._timeout = timeout
+
+    @property
+    def startNs(self):
+        return self._startNs.value or None
+
+    @property
+    def stopNs(self):
+        return self._stopNs.value or None
+
+    def start(self):
+        self._ready.set()
+        if not self._go.wait(self._timeout):
+            raise RuntimeError('Frame clock did not start within %.1f s' % self._timeout)
+        if self.startNs is None:
+            raise RuntimeError('Recording cancelled before the frame clock started')
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _cameraWorker(name, openCamera, outdir, sessionKwargs, clockArgs, conn):
+    """ Worker process: open one camera and record whenever the parent asks. """
+    import ICtools
+    try:
+        cam = openCamera()
+        session = ICtools.AcquisitionSession(cam, outdir, mode='trigger',
+                                             clock=_SharedClock(*clockArgs), **sessionKwargs)
+        session.open()
+        lWidth, lHeight = cam.GetImageDescription()[:2]
+        conn.send(('ok', {'frameShape': (lHeight, lWidth), 'dtype': ICtools._stackDtype(cam),
+                          'shareName': session.share.name if session.share is not None else None}))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        return
+    try:
+        while True:
+            cmd, kwargs = conn.recv()
+            if cmd == 'close':
+                break
+            try:
+                # workers share the parent's resource tracker, which unlinks the block
+                nEdges = kwargs.pop('lastEdges')
+                if nEdges is not None:
+                    # the parent stopped the clock after this camera's last trial ended
+                    session.clockStopped(nEdges)
+                shm = shared_memory.SharedMemory(name=kwargs.pop('shmName'))
+                try:
+                    out = np.ndarray(kwargs.pop('shape'), dtype=kwargs.pop('dtype'), buffer=shm.buf)
+                    stack, report = session.record(out=out, returnReport=True, **kwargs)
+                    result = {'nFrames': stack.shape[0], 'report': report}
+                    del stack, out
+                finally:
+                    shm.close()
+                conn.send(('ok', result))
+            except Exception:
+                conn.send(('error', traceback.format_exc()))
+    finally:
+        session.close()
+
+
+class MultiCamRecorder(object):
+    """ Several cameras on one LabJack frame clock, each in its own process.
+
+    Args:
+        cameras: (dict) camera name -> picklable function returning an opened,
+            configured camera (see openTISCamera). Names are added to file names.
+        outdir: (str) path to output directory
+        labjack: (module) LabJack driver module, see ICtools.acquireStack
+        frameRate: (float) clock rate; the U6 timer gets as close as it can
+        sinkFormat: (SinkFormats) sink to request on every camera, or None
+        showLive: (int) 1 to show each driver's live window, 0 to run headless
+        nSlots: (int) frame ring length per camera
+        startTimeout: (float) seconds to wait for cameras to open or get ready
+        share: (str or bool) publish each camera's frames for other processes to
+            watch, see ICtools.AcquisitionSession: a name prefix (camera 'eyeL'
+            shares as '<share>-eyeL'), True for generated names, or None. The
+            names are in self.shareNames.
+    """
+    dioPortNum = 0  # FIO0
+
+    def __init__(self, cameras, outdir, labjack=None, frameRate=15.0, sinkFormat=None,
+                 showLive=0, nSlots=64, startTimeout=30.0, share=None):
+        import tisgrabber as ic
+        self.cameras = dict(cameras)
+        self.outdir = outdir
+        self.labjack = labjack
+        self.frameRate = frameRate
+        self.sinkFormat = ic.SinkFormats.Y800 if sinkFormat is None else sinkFormat
+        self.showLive = showLive
+        self.nSlots = nSlots
+        self.startTimeout = startTimeout
+        self.share = share
+        self.shareNames = {}
+        self.clock = None
+        self.u6Obj = None
+        self._ctx = multiprocessing.get_context('spawn')
+        self._workers = {}
+        self._blocks = []
+        self._lastEdges = None  # clock edges issued in the last trial
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+        return False
+
+    def open(self):
+        """ Open the U6 and start one worker process per camera.
+
+        Returns:
+            self.
+            raises RuntimeError if a camera fails to open.
+        """
+        try:
+            self.labjack, self.u6Obj = ljsync.openU6(self.labjack, self.dioPortNum)
+            self.clock = ljsync.HardwareClock(self.labjack, self.dioPortNum, self.frameRate, u6Obj=self.u6Obj)
+            self._go = self._ctx.Event()
+            self._startNs = self._ctx.Value('q', 0, lock=False)
+            self._stopNs = self._ctx.Value('q', 0, lock=False)
+            for name, openCamera in self.cameras.items():
+                sessionKwargs = {'sinkFormat': self.sinkFormat, 'showLive': self.showLive, 'nSlots': self.nSlots,
+                                 'share': '{}-{}'.format(self.share, name) if isinstance(self.share, str)
+                                 else self.share}
+                ready = self._ctx.Event()
+                conn, workerConn = self._ctx.Pipe()
+                clockArgs = (self.clock.frameRate, ready, self._go, self._startNs, self._stopNs,
+                             self.startTimeout)
+                proc = self._ctx.Process(target=_cameraWorker, name='camera-' + name, daemon=True,
+                                         args=(name, openCamera, self.outdir, sessionKwargs,
+                                               clockArgs, workerConn))
+                proc.start()
+                self._workers[name] = {'proc': proc, 'conn': conn, 'ready': ready}
+            errors = {}
+            for name, w in self._workers.items():
+                status, info = self._recv(name, self.startTimeout)
+                if status == 'ok':
+                    w.update(info)
+                    self.shareNames[name] = info['shareName']
+                else:
+                    errors[name] = info
+            if errors:
+                raise RuntimeError('Cameras failed to open:\n' + '\n'.join(
+                    '{}: {}'.format(name, err) for name, err in errors.items()))
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def _recv(self, name, timeout):
+        w = self._workers[name]
+        if not w['conn'].poll(timeout):
+            return 'error', 'no reply within {:.0f} s'.format(timeout)
+        try:
+            return w['conn'].recv()
+        except EOFError:
+            return 'error', 'worker process exited'
+
+    def _release(self):
+        for shm in self._blocks:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # the caller still holds a stack; the memory goes with it
+            shm.unlink()
+        self._blocks = []
+
+    def record(self, nFrames, downscaleTuple, animal, returnReport=False, **recordKwargs):
+        """ Record one stack from every camera on the same clock edges.
+
+        Args:
+            nFrames: (int) number of frames per camera
+            downscaleTuple: (tuple) downscale factor in (z, x, y)
+            animal: (str) animal ID; files are <animal>_<camera name>_<time>...
+            returnReport: (bool) also return each camera's report
+            **recordKwargs: other ICtools.AcquisitionSession.record arguments
+                (not stream or out)
+
+        Returns:
+            stacks: (dict) camera name -> stack in shared memory. Valid until the
+                next record() or close(); copy to keep.
+            reports: (dict) camera name -> report, only if returnReport. Each
+                report's 'ttl' has the common clock's pulse count and rate.
+            raises RuntimeError if any camera fails.
+        """
+        import ICtools
+        if 'stream' in recordKwargs or 'out' in recordKwargs:
+            raise ValueError('MultiCamRecorder stacks are always returned in shared memory')
+        self._release()
+        self._stopNs.value = 0
+        self._startNs.value = 0
+        self._go.clear()
+        shapes = {}
+        for name, w in self._workers.items():
+            shape = ICtools.binnedShape(w['frameShape'], nFrames, downscaleTuple)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) *
+                                                                    np.dtype(w['dtype']).itemsize))
+            self._blocks.append(shm)
+            shapes[name] = (shape, shm)
+            w['ready'].clear()
+            w['conn'].send(('record', dict(recordKwargs, nFrames=nFrames, downscaleTuple=downscaleTuple,
+                                           animal='{}_{}'.format(animal, name), shmName=shm.name,
+                                           shape=shape, dtype=w['dtype'], lastEdges=self._lastEdges)))
+
+        # start the clock once every camera waits for frames
+        deadline = time.perf_counter() + self.startTimeout
+        allReady = False
+        while time.perf_counter() < deadline:
+            if all(w['ready'].is_set() for w in self._workers.values()):
+                allReady = True
+                break
+            if any(w['conn'].poll() for w in self._workers.values()):
+                break  # a camera failed before getting ready
+            time.sleep(0.001)
+        if allReady:
+            self.clock.start()
+            self._startNs.value = self.clock.startNs
+        self._go.set()  # without a start time, waiting cameras give up at once
+        replies = {name: self._recv(name, nFrames / self.clock.frameRate + self.startTimeout)
+                   for name in self._workers}
+        if allReady:
+            self.clock.stop()
+            self._stopNs.value = self.clock.stopNs
+        # each camera keeps frames from this trial's last edges out of the next one
+        self._lastEdges = len(self.clock.pulseTimes()) if allReady else 0
+
+        errors = {name: info for name, (status, info) in replies.items() if status != 'ok'}
+        if errors:
+            raise RuntimeError('Recording failed:\n' + '\n'.join(
+                '{}: {}'.format(name, err) for name, err in errors.items()))
+        stacks = {}
+        for name, (shape, shm) in shapes.items():
+            stack = np.ndarray(shape, dtype=self._workers[name]['dtype'], buffer=shm.buf)
+            stacks[name] = stack[:replies[name][1]['nFrames']]
+        if returnReport:
+            return stacks, {name: info['report'] for name, (status, info) in replies.items()}
+        return stacks
+
+    def close(self):
+        """ Stop the workers (closing their cameras), the clock and the U6. """
+        for name, w in self._workers.items():
+            try:
+                w['conn'].send(('close', None))
+            except (OSError, BrokenPipeError):
+                pass
+        for w in self._workers.values():
+            w['proc'].join(self.startTimeout)
+            if w['proc'].is_alive():
+                w['proc'].terminate()
+        self._workers = {}
+        self._release()
+        if self.clock is not None:
+            self.clock.close()
+            self.clock = None
+        if self.u6Obj is not None:
+            self.u6Obj.close()
+            self.u6Obj = None
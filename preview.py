@@ -0,0 +1,246 @@
+"""
+Headless live preview: a decimated, downsampled copy of the feed for display.
+
+StartLive(1) has the driver draw every frame into its own window, which costs
+CPU during recording and hangs if the window is clicked. Instead run the camera
+headless (StartLive(0)) and hand frames to a PreviewStage. It takes every Nth
+frame, or the newest frame at a capped rate, and downsamples and displays it
+on its own thread. offer() never waits: if the preview is still busy with the
+last frame, the new one is skipped.
+
+    stage = preview.PreviewStage(maxRate=10, downscale=(2, 2), display=preview.notebookDisplay())
+    ICtools.startPreview(cam, stage)        # look at the feed without recording
+    ICtools.stopPreview(cam)
+    ICtools.acquireStack(cam, 1800, (1, 2, 2), animal, outdir, preview=stage)
+    stage.close()
+
+A viewer in another process can preview a recording's shared frames
+(AcquisitionSession share=...) with previewShared.
+"""
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+
+def downsample(frame, downscale):
+    """ Block-mean downsample of one frame, dropping edge rows and columns that
+    don't fill a block.
+
+    Args:
+        frame: (np.ndarray) frame in (x, y), integer
+        downscale: (tuple) factor in (x, y)
+
+    Returns:
+        (np.ndarray) downsampled frame, same dtype.
+    """
+    binY, binX = downscale
+    h, w = frame.shape[0] // binY, frame.shape[1] // binX
+    # summing strided views is several times faster than a reshape and sum
+    acc = np.zeros((h, w), dtype=np.uint32)
+    for dy in range(binY):
+        for dx in range(binX):
+            acc += frame[dy:h * binY:binY, dx:w * binX:binX]
+    acc //= binY * binX
+    return acc.astype(frame.dtype)
+
+
+def toUint8(image):
+    """ Image as uint8 for display: 16 bit images keep their top 8 bits. """
+    if image.dtype == np.uint8:
+        return image
+    return (image >> 8 * (image.dtype.itemsize - 1)).astype(np.uint8)
+
+
+def pngBytes(image):
+    """ Encode a 2D uint8 image as a greyscale PNG, without an imaging library.
+
+    Returns:
+        (bytes) PNG file contents.
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    h, w = image.shape
+    rows = np.zeros((h, w + 1), dtype=np.uint8)  # each row starts with filter type 0
+    rows[:, 1:] = image
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 0, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows.tobytes(), 1)) + chunk(b'IEND', b''))
+
+
+def notebookDisplay():
+    """ A PreviewStage display function that shows frames in one Jupyter output,
+    updated in place.
+
+    Returns:
+        display: (fn) display(image, frameNum).
+    """
+    from IPython import display as ipd
+    handle = ipd.display(ipd.Image(data=pngBytes(np.zeros((1, 1), dtype=np.uint8))), display_id=True)
+
+    def display(image, frameNum):
+        handle.update(ipd.Image(data=pngBytes(toUint8(image))))
+    return display
+
+
+class PreviewStage(object):
+    """ Decimated preview of a frame stream, processed on its own thread.
+
+    The producer calls offer() for every frame. A frame is taken if it is every
+    Nth (every=N), or if 1/maxRate seconds have passed since the last taken one
+    (every=None). Taking it is one copy into a spare buffer; downsampling and
+    display happen on the preview thread. A frame taken while the thread still
+    works on the previous one replaces it if that wasn't started yet, and is
+    otherwise skipped, so offer() never waits on the preview.
+
+    Args:
+        every: (int) take every Nth frame, or None to cap the rate instead
+        maxRate: (float) frames per second to take when every is None
+        downscale: (tuple) block-mean downsampling in (x, y)
+        display: (fn) called on the preview thread as display(image, frameNum)
+            with each downsampled frame, e.g. notebookDisplay(), or None to only
+            keep the latest (see latest)
+    """
+
+    def __init__(self, every=None, maxRate=10.0, downscale=(2, 2), display=None):
+        self.every = every
+        self.maxRate = maxRate
+        self.downscale = tuple(downscale)
+        self.display = display
+        self.latest = None  # (image, frameNum, snapNs) of the last frame shown
+        self.nOffered = 0
+        self.nTaken = 0
+        self.nSkipped = 0
+        self.nShown = 0
+        self._nextNs = 0
+        self._pending = None  # (buffer, frameNum, snapNs) waiting for the thread
+        self._spare = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='PreviewStage', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+        return False
+
+    def offer(self, frame, frameNum=-1, snapNs=None):
+        """ Offer one frame; returns at once.
+
+        Args:
+            frame: (np.ndarray) frame in (x, y); copied if taken
+            frameNum: (int) frame number, passed on to display
+            snapNs: (int) perf_counter_ns of the frame, or None
+
+        Returns:
+            taken: (bool) whether the frame went to the preview.
+        """
+        self.nOffered += 1
+        if self.every is not None:
+            if (self.nOffered - 1) % self.every:
+                return False
+        else:
+            now = time.perf_counter_ns()
+            if now < self._nextNs:
+                return False
+            self._nextNs = now + int(1e9 / self.maxRate)
+        if not self._lock.acquire(blocking=False):
+            self.nSkipped += 1  # the thread is swapping buffers right now
+            return False
+        try:
+            buf = self._spare
+            if buf is None or buf.shape != frame.shape or buf.dtype != frame.dtype:
+                buf = np.empty(frame.shape, dtype=frame.dtype)
+            np.copyto(buf, frame)
+            if self._pending is not None:
+                self.nSkipped += 1  # replaced before the thread got to it
+            self._spare = self._pending[0] if self._pending is not None else None
+            self._pending = (buf, frameNum, snapNs)
+        finally:
+            self._lock.release()
+        self.nTaken += 1
+        self._wake.set()
+        return True
+
+    def _run(self):
+        try:
+            while True:
+                self._wake.wait()
+                with self._lock:
+                    self._wake.clear()
+                    if self._closed:
+                        return
+                    pending, self._pending = self._pending, None
+                if pending is None:
+                    continue
+                buf, frameNum, snapNs = pending
+                image = downsample(buf, self.downscale)
+                with self._lock:
+                    if self._spare is None:
+                        self._spare = buf
+                self.latest = (image, frameNum, snapNs)
+                if self.display is not None:
+                    self.display(image, frameNum)
+                self.nShown += 1
+        except Exception as e:
+            self._error = e
+
+    def report(self):
+        """ Frames offered, taken, skipped (taken but dropped because the preview
+        was busy) and shown so far.
+        """
+        return {'offered': self.nOffered, 'taken': self.nTaken, 'skipped': self.nSkipped,
+                'shown': self.nShown}
+
+    def close(self):
+        """ Stop the preview thread. Frames still pending are not shown. """
+        if self._thread is not None:
+            with self._lock:
+                self._closed = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise RuntimeError('Preview thread failed: %s' % self._error)
+
+
+def previewShared(name, stage, timeout=10.0):
+    """ Preview frames published into a sharedring.SharedFrameRing, e.g. by an
+    AcquisitionSession with share=name in another process, until the writer
+    closes the ring. Only the newest frame is offered each time, so a slow
+    viewer skips frames instead of falling behind.
+
+    Args:
+        name: (str) the ring's name
+        stage: (PreviewStage) preview to offer the frames to
+        timeout: (float) seconds to wait for the ring to appear and between frames
+
+    Returns:
+        nothing.
+    """
+    import sharedring
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader = sharedring.SharedFrameReader(name)
+            break
+        except FileNotFoundError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.05)
+    with reader:
+        seq = 0
+        while not reader.closed:
+            newSeq = reader.wait(seq, timeout)
+            if newSeq == seq:
+                continue
+            seq = newSeq
+            got = reader.get(seq)
+            if got is not None:
+                stage.offer(*got)
@@ -0,0 +1,174 @@
+"""
+Online pupil tracking: pupil centre, area and ellipse for every frame as it is
+recorded.
+
+PupilTracker thresholds the (binned) frame inside an ROI, keeps the largest
+dark connected component and fits an ellipse to it from its image moments.
+Everything is whole-array NumPy (plus scipy.ndimage for the component
+labelling); a 320x240 binned frame takes about a millisecond, see
+benchmark.py --pupil.
+
+    tracker = pupil.PupilTracker(roi=(40, 200, 60, 260))
+    stack = ICtools.acquireStack(cam, 1800, (1, 2, 2), animal, outdir, tracker=tracker)
+    trace = np.load(<outBase> + '_pupil.npy')     # one PUPIL_DTYPE row per stack frame
+
+Coordinates and sizes are in pixels of the frames the tracker is given, i.e.
+of the binned stack, with (0, 0) the top left of the frame (not of the ROI).
+"""
+import time
+
+import numpy as np
+
+# one row per analyzed frame; NaN where no pupil was found
+PUPIL_DTYPE = np.dtype([('frameNum', np.int64),   # driver frame number (last frame of a z block)
+                        ('snapNs', np.int64),     # that frame handed over by the driver, perf_counter_ns
+                        ('doneNs', np.int64),     # analysis finished, perf_counter_ns
+                        ('valid', np.bool_),      # a pupil was found
+                        ('area', np.float32),     # pupil pixels
+                        ('centerY', np.float32),
+                        ('centerX', np.float32),
+                        ('major', np.float32),    # ellipse axis lengths (full, not semi-axes)
+                        ('minor', np.float32),
+                        ('angle', np.float32)])   # major axis angle from the x axis, radians
+
+
+def newTrace(nFrames):
+    """ Empty trace of nFrames rows: invalid, NaN, times -1. """
+    trace = np.zeros(nFrames, dtype=PUPIL_DTYPE)
+    for field in ('frameNum', 'snapNs', 'doneNs'):
+        trace[field] = -1
+    for field in ('area', 'centerY', 'centerX', 'major', 'minor', 'angle'):
+        trace[field] = np.nan
+    return trace
+
+
+def otsuThreshold(frame):
+    """ Otsu threshold of an integer image: the level that best splits its
+    histogram into two classes. Pixels below it are the dark class.
+
+    Returns:
+        (int) threshold.
+    """
+    counts = np.bincount(np.asarray(frame, dtype=np.int64).ravel())
+    levels = np.arange(len(counts))
+    w0 = np.cumsum(counts)
+    w1 = w0[-1] - w0
+    s0 = np.cumsum(counts * levels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = w0 * w1 * (s0 / w0 - (s0[-1] - s0) / w1) ** 2
+    between = np.nan_to_num(between[:-1])
+    # empty histogram bins make a plateau of equally good levels; take its middle
+    best = np.flatnonzero(between >= between.max() * (1 - 1e-9))
+    return int((best[0] + best[-1]) // 2) + 1
+
+
+class PupilTracker(object):
+    """ Per-frame pupil centre, area and ellipse fit.
+
+    Args:
+        roi: (tuple) (top, bottom, left, right) in frame pixels to search, or None
+            for the whole frame
+        threshold: (int) pixels darker than this are pupil candidates, or None to
+            set it from the first frame with otsuThreshold
+        minArea: (int) fewer candidate pixels than this is no pupil
+        components: (bool) keep only the largest connected dark region, so eyelid
+            shadows and lashes away from the pupil don't pull the fit. Needs
+            scipy; without it all candidate pixels are used.
+        fillHoles: (bool) with components, count the corneal reflection and other
+            bright holes inside the pupil as pupil
+    """
+
+    def __init__(self, roi=None, threshold=None, minArea=20, components=True, fillHoles=True):
+        self.roi = tuple(roi) if roi is not None else None
+        self.threshold = threshold
+        self.minArea = minArea
+        self.ndimage = None
+        if components:
+            try:
+                from scipy import ndimage
+                self.ndimage = ndimage
+            except ImportError:
+                print('Warning: scipy not found, pupil tracking without connected components.')
+        self.fillHoles = fillHoles
+        self._grids = None
+
+    def _window(self, frame):
+        if self.roi is None:
+            return frame
+        top, bottom, left, right = self.roi
+        return frame[top:bottom, left:right]
+
+    def process(self, frame, row):
+        """ Find the pupil in one frame.
+
+        Args:
+            frame: (np.ndarray) frame in (x, y), e.g. one binned stack frame
+            row: (np.ndarray) one-row slice of a trace (see newTrace) to fill in;
+                frameNum and snapNs are left to the caller
+
+        Returns:
+            (bool) whether a pupil was found.
+        """
+        window = self._window(frame)
+        if self.threshold is None:
+            self.threshold = otsuThreshold(window)
+        mask = window < self.threshold
+        if self.ndimage is not None:
+            labels, nLabels = self.ndimage.label(mask)
+            if nLabels > 1:
+                mask = labels == np.argmax(np.bincount(labels.ravel())[1:]) + 1
+            if self.fillHoles and nLabels:
+                # only inside the pupil's bounding box, which is much cheaper
+                rowsHit, colsHit = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+                box = mask[rowsHit[0]:rowsHit[-1] + 1, colsHit[0]:colsHit[-1] + 1]
+                box[...] = self.ndimage.binary_fill_holes(box)
+        if self._grids is None or self._grids[0].shape[0] != mask.shape[0] \
+                or self._grids[1].shape[0] != mask.shape[1]:
+            top, left = (self.roi[0], self.roi[2]) if self.roi is not None else (0, 0)
+            self._grids = (np.arange(top, top + mask.shape[0], dtype=np.float64),
+                           np.arange(left, left + mask.shape[1], dtype=np.float64))
+        y, x = self._grids
+
+        # image moments from row and column sums, without listing pixel coordinates
+        m = mask.view(np.uint8)
+        rows = m.sum(axis=1, dtype=np.int64)
+        area = rows.sum()
+        if area < self.minArea:
+            row['valid'] = False
+            row['doneNs'] = time.perf_counter_ns()
+            return False
+        cols = m.sum(axis=0, dtype=np.int64)
+        cy = rows @ y / area
+        cx = cols @ x / area
+        muYY = rows @ (y * y) / area - cy * cy
+        muXX = cols @ (x * x) / area - cx * cx
+        muXY = y @ (m @ x) / area - cy * cx
+
+        # ellipse with the same second moments: axes from the covariance eigenvalues
+        common = np.sqrt(((muXX - muYY) / 2) ** 2 + muXY ** 2)
+        lMajor = (muXX + muYY) / 2 + common
+        lMinor = max((muXX + muYY) / 2 - common, 0.)
+        row['valid'] = True
+        row['area'] = area
+        row['centerY'] = cy
+        row['centerX'] = cx
+        row['major'] = 4 * np.sqrt(lMajor)
+        row['minor'] = 4 * np.sqrt(lMinor)
+        row['angle'] = 0.5 * np.arctan2(2 * muXY, muXX - muYY)
+        row['doneNs'] = time.perf_counter_ns()
+        return True
+
+
+def summarizeTrace(trace):
+    """ Fraction of frames with a pupil and the analysis latency.
+
+    Returns:
+        (dict) 'frames', 'found' (fraction valid), 'latencyMs' (snapNs to doneNs:
+        mean, max; None without snap times).
+    """
+    timed = trace[(trace['snapNs'] >= 0) & (trace['doneNs'] >= 0)]
+    latencyMs = (timed['doneNs'] - timed['snapNs']) / 1e6
+    return {'frames': len(trace),
+            'found': float(trace['valid'].mean()) if len(trace) else 0.,
+            'latencyMs': {'mean': float(latencyMs.mean()), 'max': float(latencyMs.max())}
+            if len(latencyMs) else None}
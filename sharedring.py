@@ -0,0 +1,279 @@
+"""
+Camera frames shared live with other processes.
+
+The acquisition loop publishes each frame once into a ring of slots in
+multiprocessing.shared_memory; any number of reader processes (previewer,
+tracker, QC dashboard) attach by name and look at the slots in place. The
+writer never waits for, or even knows about, its readers, so adding one costs
+the recording nothing.
+
+Every published frame gets a sequence number, 1, 2, 3, ... Each slot carries
+the sequence number of the frame in it, set to 0 while the frame is being
+replaced, so a reader can tell whether a frame it looked at was overwritten
+underneath it (isCurrent) and how many frames it missed.
+
+    # recording process
+    session = ICtools.AcquisitionSession(cam, outdir, mode='callback', share='rig1')
+
+    # any other process
+    reader = sharedring.SharedFrameReader('rig1')
+    seq = 0
+    while not reader.closed:
+        seq = reader.wait(seq)
+        if seq:
+            frame, frameNum, snapNs = reader.get(seq)
+            ...  # use frame in place
+            if not reader.isCurrent(seq):
+                ...  # overwritten while in use; drop the result
+"""
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+_MAGIC = 0x474e495246534954  # 'TISFRING'
+
+_HEADER_DTYPE = np.dtype([('magic', '<u8'), ('writeSeq', '<i8'), ('nSlots', '<i8'),
+                          ('height', '<i8'), ('width', '<i8'), ('closed', '<i8'),
+                          ('dtype', 'S8'), ('tracker', '<u8')])
+
+# per slot: sequence number of the frame in it (0 while being written), driver
+# frame number (-1 if unknown) and perf_counter_ns of the frame
+_SLOT_DTYPE = np.dtype([('seq', '<i8'), ('frameNum', '<i8'), ('snapNs', '<i8')])
+
+
+def _layout(nSlots, height, width, dtype):
+    """ Byte offsets of the slot table and frames, and the total segment size. """
+    slotsOffset = _HEADER_DTYPE.itemsize
+    framesOffset = -(-(slotsOffset + nSlots * _SLOT_DTYPE.itemsize) // 64) * 64
+    return slotsOffset, framesOffset, framesOffset + nSlots * height * width * np.dtype(dtype).itemsize
+
+
+def _trackerId():
+    """ Identity of this process's multiprocessing resource tracker (the inode of
+    its pipe, the same in every process using that tracker), or 0 where shared
+    memory is not tracked (Windows). Call after creating or attaching a segment,
+    which starts the tracker.
+    """
+    fd = getattr(resource_tracker._resource_tracker, '_fd', None)
+    return os.fstat(fd).st_ino if os.name == 'posix' and fd is not None else 0
+
+
+class _RingView(object):
+    """ Header, slot table and frames of one ring segment. """
+
+    def _map(self, shm):
+        self._shm = shm
+        self._header = np.ndarray((), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        self.nSlots = int(self._header['nSlots'])
+        self.frameShape = (int(self._header['height']), int(self._header['width']))
+        self.dtype = np.dtype(self._header['dtype'].item().decode())
+        slotsOffset, framesOffset = _layout(self.nSlots, self.frameShape[0], self.frameShape[1],
+                                            self.dtype)[:2]
+        self._slots = np.ndarray(self.nSlots, dtype=_SLOT_DTYPE, buffer=shm.buf, offset=slotsOffset)
+        self.frames = np.ndarray((self.nSlots,) + self.frameShape, dtype=self.dtype,
+                                 buffer=shm.buf, offset=framesOffset)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def writeSeq(self):
+        """ Sequence number of the newest published frame, 0 before the first. """
+        return int(self._header['writeSeq'])
+
+    def _unmap(self):
+        self._header = self._slots = self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # a caller still holds a frame view; the mapping goes with it
+
+
+class SharedFrameRing(_RingView):
+    """ Writer side: a ring of frames in shared memory, one publisher.
+
+    Args:
+        frameShape: (tuple) (height, width) of one frame
+        dtype: frame dtype, e.g. np.uint8, or np.uint16 for a Y16 sink
+        nSlots: (int) ring length in frames; readers must look at a frame within
+            nSlots frame periods of it being published
+        name: (str) shared memory name readers attach to, or None for a generated one
+    """
+
+    def __init__(self, frameShape, dtype=np.uint8, nSlots=16, name=None):
+        height, width = frameShape
+        size = _layout(nSlots, height, width, dtype)[2]
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        header['nSlots'], header['height'], header['width'] = nSlots, height, width
+        header['dtype'] = np.dtype(dtype).str.encode()
+        header['tracker'] = _trackerId()
+        header['magic'] = _MAGIC
+        del header
+        self._map(shm)
+        self._slots['frameNum'] = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+        return False
+
+    def publish(self, frame, frameNum=-1, snapNs=None):
+        """ Copy one frame into the next slot, overwriting the oldest.
+
+        Args:
+            frame: (np.ndarray) frame of frameShape; cast to the ring's dtype
+            frameNum: (int) driver frame number, or -1 if there is none
+            snapNs: (int) perf_counter_ns of the frame, or None for now
+
+        Returns:
+            seq: (int) sequence number of the published frame.
+        """
+        seq = self.writeSeq + 1
+        iSlot = seq % self.nSlots
+        slot = self._slots[iSlot:iSlot + 1]
+        slot['seq'] = 0  # readers of the old frame see it is gone
+        np.copyto(self.frames[iSlot], frame, casting='unsafe')
+        slot['frameNum'] = frameNum
+        slot['snapNs'] = time.perf_counter_ns() if snapNs is None else snapNs
+        slot['seq'] = seq
+        self._header['writeSeq'] = seq
+        return seq
+
+    def close(self):
+        """ Mark the ring closed for readers and remove the segment. Readers keep
+        their mapping until they close. Safe to call more than once.
+        """
+        if self._header is None:
+            return
+        self._header['closed'] = 1
+        self._unmap()
+        self._shm.unlink()
+
+
+class SharedFrameReader(_RingView):
+    """ Reader side: attach to a SharedFrameRing by name and look at its frames in place.
+
+    Readers never write to the segment and never block the writer. Frame views
+    from get() and latest() point into the ring, so they are only valid while
+    isCurrent(seq) is true; check it after using a frame, or copy with read().
+
+    Before Python 3.13, attaching registers the segment with this process's
+    resource tracker, which would remove it when this process exits. Unless
+    the writer uses the same tracker (processes started from one another with
+    multiprocessing share it), the registration is undone here.
+
+    Args:
+        name: (str) the ring's name
+    """
+
+    def __init__(self, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+            tracked = False
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+            tracked = os.name == 'posix'
+        header = np.ndarray((), dtype=_HEADER_DTYPE, buffer=shm.buf)
+        magic, writerTracker = int(header['magic']), int(header['tracker'])
+        del header
+        if tracked and writerTracker != _trackerId():
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        if magic != _MAGIC:
+            shm.close()
+            raise ValueError('%s is not a shared frame ring' % name)
+        self._map(shm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self.close()
+        return False
+
+    @property
+    def closed(self):
+        """ True once the writer has closed the ring; no more frames will come. """
+        return bool(self._header['closed'])
+
+    def isCurrent(self, seq):
+        """ True if frame seq is still in its slot (not yet overwritten). """
+        return seq > 0 and int(self._slots['seq'][seq % self.nSlots]) == seq
+
+    def get(self, seq):
+        """ Frame seq, in place.
+
+        Args:
+            seq: (int) sequence number, at most writeSeq
+
+        Returns:
+            frame: (np.ndarray) view of the frame's slot, valid while isCurrent(seq)
+            frameNum: (int) driver frame number, or -1
+            snapNs: (int) perf_counter_ns of the frame.
+            None if the frame was overwritten or is being written.
+        """
+        if not self.isCurrent(seq):
+            return None
+        iSlot = seq % self.nSlots
+        slot = self._slots[iSlot]
+        frameNum, snapNs = int(slot['frameNum']), int(slot['snapNs'])
+        if not self.isCurrent(seq):
+            return None
+        return self.frames[iSlot], frameNum, snapNs
+
+    def latest(self):
+        """ The newest frame, in place.
+
+        Returns:
+            seq: (int) its sequence number
+            frame, frameNum, snapNs: as get.
+            None if nothing has been published or the newest slot is being written.
+        """
+        seq = self.writeSeq
+        got = self.get(seq) if seq else None
+        return None if got is None else (seq,) + got
+
+    def read(self, seq, out):
+        """ Copy frame seq into out.
+
+        Returns:
+            (frameNum, snapNs), or None if the frame was overwritten before or
+            during the copy (out then holds garbage).
+        """
+        got = self.get(seq)
+        if got is None:
+            return None
+        np.copyto(out, got[0])
+        return got[1:] if self.isCurrent(seq) else None
+
+    def wait(self, afterSeq=0, timeout=1.0, poll=0.001):
+        """ Wait for a frame newer than afterSeq. Polls, so the writer never signals anyone.
+
+        Args:
+            afterSeq: (int) last sequence number seen
+            timeout: (float) seconds to wait
+            poll: (float) seconds between looks at the header
+
+        Returns:
+            seq: (int) the newest sequence number, > afterSeq, or afterSeq on
+                timeout or once the ring is closed. The frames in between were
+                skipped if seq - afterSeq > 1.
+        """
+        deadline = time.perf_counter() + timeout
+        while True:
+            seq = self.writeSeq
+            if seq > afterSeq:
+                return seq
+            if self.closed or time.perf_counter() >= deadline:
+                return afterSeq
+            time.sleep(poll)
+
+    def close(self):
+        """ Detach from the ring. Safe to call more than once. """
+        if self._header is not None:
+            self._unmap()
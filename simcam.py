@@ -0,0 +1,383 @@
+"""
+Simulated TIS camera with the same interface as tisgrabber.TIS_CAM, for running
+ICtools without the camera or the Windows DLL.
+
+The camera free-runs at its frame rate from StartLive. SnapImage waits for the
+next frame like the real driver, and in continuous mode a driver thread calls
+the frame-ready callback with each frame. With the 'Trigger' 'Enable' switch
+on, frames are only produced on trigger() calls (see fakeu6.connectTrigger).
+Frame content, jitter and drops come from a seeded generator, so runs are
+repeatable.
+
+    import simcam, fakeu6
+    cam = simcam.SimCam(width=640, height=480, frameRate=60.0)
+    stack = ICtools.acquireStack(cam, 600, (1, 2, 2), 'sim', outdir, labjack=fakeu6)
+"""
+import ctypes as C
+import json
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+from tisgrabber import SinkFormats
+
+
+_BITS_PER_PIXEL = {SinkFormats.Y800: 8, SinkFormats.RGB24: 24, SinkFormats.RGB32: 32,
+                   SinkFormats.UYVY: 16, SinkFormats.Y16: 16}
+
+# what the simulated device reports it supports
+_VIDEO_FORMATS = ['{} ({}x{})'.format(sink, w, h) for sink in ('Y800', 'Y16', 'RGB24')
+                  for w, h in ((640, 480), (1280, 960))]
+_FRAME_RATES = [3.75, 7.5, 15.0, 30.0, 60.0]
+_VALUE_RANGES = {('Brightness', 'Value'): (0, 255), ('Contrast', 'Value'): (-10, 30),
+                 ('Gain', 'Value'): (0, 63), ('Exposure', 'Auto Reference'): (0, 255),
+                 ('Sharpness', 'Value'): (0, 14), ('Gamma', 'Value'): (1, 500),
+                 ('Denoise', 'Value'): (0, 16), ('Partial scan', 'X Offset'): (0, 2000),
+                 ('Partial scan', 'Y Offset'): (0, 1500)}
+_ABSOLUTE_RANGES = {('Exposure', 'Value'): (1e-4, 30.), ('Exposure', 'Auto Max Value'): (1e-4, 30.)}
+_SWITCHES = {('Gain', 'Auto'), ('Exposure', 'Auto'), ('Highlight reduction', 'Enable'),
+             ('Partial scan', 'Auto-center'), ('Trigger', 'Enable'), ('Strobe', 'Enable'),
+             ('Strobe', 'Polarity'), ('Tone Mapping', 'Enable')}
+
+
+class SimCam(object):
+    """ Simulated camera.
+
+    Args:
+        width, height: (int) frame size in pixels
+        sinkFormat: (SinkFormats) initial sink format
+        frameRate: (float) frames per second while live
+        latency: (float) seconds from the end of a frame period to its delivery
+        jitter: (float) extra delivery delay per frame, uniform in [0, jitter) seconds
+        dropRate: (float) probability that the driver loses a frame
+        seed: (int) seed for frame content, jitter and drops
+        nTemplates: (int) number of distinct frames to cycle through
+    """
+
+    def __init__(self, width=640, height=480, sinkFormat=SinkFormats.Y800, frameRate=15.0,
+                 latency=0.0, jitter=0.0, dropRate=0.0, seed=0, nTemplates=16):
+        self.width = width
+        self.height = height
+        self.frameRate = frameRate
+        self.latency = latency
+        self.jitter = jitter
+        self.dropRate = dropRate
+        self.seed = seed
+        self.nTemplates = nTemplates
+        self.uniqueName = 'SimCam %d' % seed
+        self.properties = {}
+        self.nDropped = 0
+        self._format = sinkFormat
+        self._live = False
+        self._continuous = True  # snap mode, as TIS_CAM after SetContinuousMode(1)
+        self._triggered = False
+        self._triggers = queue.Queue()
+        self._callback = None
+        self._callbackData = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._buildFrames()
+
+    def _buildFrames(self):
+        """ Render the template frames: a dark pupil of varying size and position on a
+        noisy background, with a small bright corneal reflection.
+        """
+        rng = np.random.default_rng(self.seed)
+        yy, xx = np.mgrid[:self.height, :self.width]
+        phase = 2 * np.pi * np.arange(self.nTemplates) / self.nTemplates
+        r0 = min(self.height, self.width) / 8.
+        self.pupils = np.stack([self.height / 2. + r0 / 4. * np.sin(phase),
+                                self.width / 2. + r0 / 2. * np.cos(phase),
+                                r0 * (1 + 0.3 * np.sin(phase))], axis=1)  # (y, x, radius)
+        grey = np.empty((self.nTemplates, self.height, self.width), dtype=np.uint16)
+        for iT, (cy, cx, r) in enumerate(self.pupils):
+            im = rng.normal(160, 8, size=(self.height, self.width))
+            im[(yy - cy) ** 2 + (xx - cx) ** 2 < r ** 2] = rng.normal(30, 4)
+            im[(yy - cy + r / 3.) ** 2 + (xx - cx - r / 3.) ** 2 < (r / 6.) ** 2] = 250
+            grey[iT] = np.clip(im, 0, 255) * 256  # 16 bit, top byte is the 8 bit value
+        self._grey = grey
+        self._setSink()
+
+    def _setSink(self):
+        """ Lay the template frames out as the sink delivers them: (y, x, bytes per pixel). """
+        nBytes = _BITS_PER_PIXEL[self._format] // 8
+        if self._format == SinkFormats.Y16:
+            frames = self._grey.astype('<u2').view(np.uint8).reshape(self._grey.shape + (2,))
+        else:
+            frames = np.repeat((self._grey >> 8).astype(np.uint8)[..., None], nBytes, axis=3)
+        self._frames = np.ascontiguousarray(frames)
+        self._image = np.zeros(self._frames.shape[1:], dtype=np.uint8)
+        self.frameNum = -1
+
+    # timing
+
+    def _waitUntil(self, tEnd):
+        """ Sleep until a frame whose exposure ends at tEnd is delivered.
+        Returns False if the frame was dropped.
+        """
+        delay = tEnd + self.latency + self._rng.uniform(0, self.jitter) - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if self.dropRate and self._rng.random() < self.dropRate:
+            self.nDropped += 1
+            return False
+        return True
+
+    def _waitFor(self, iFrame):
+        """ Free-running: sleep until frame iFrame is delivered. """
+        return self._waitUntil(self._tLive + (iFrame + 1) / self.frameRate)
+
+    def _waitForTrigger(self, timeout):
+        """ Triggered: sleep until the frame for the next trigger is delivered.
+        Returns False if the frame was dropped, None if no trigger came within timeout.
+        """
+        try:
+            tTrigger = self._triggers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        # exposure is taken as one nominal frame period
+        return self._waitUntil(tTrigger + 1. / self.frameRate)
+
+    def trigger(self, t=None):
+        """ Trigger input edge: expose one frame if live and in trigger mode.
+
+        Args:
+            t: (float) perf_counter time of the edge, if it happened before the call
+        """
+        if self._live and self._triggered:
+            self._triggers.put(time.perf_counter() if t is None else t)
+
+    def _deliver(self, iFrame):
+        self._image[...] = self._frames[iFrame % self.nTemplates]
+        self.frameNum = iFrame
+
+    def _notify(self, iFrame):
+        # like the driver, call the frame-ready callback for snapped frames too
+        if self._callback is not None:
+            self._callback(0, self._image.ctypes.data_as(C.POINTER(C.c_ubyte)), iFrame, self._callbackData)
+
+    def _run(self):
+        iFrame = 0
+        pBuffer = self._image.ctypes.data_as(C.POINTER(C.c_ubyte))
+        while not self._stop.is_set():
+            if self._triggered:
+                delivered = self._waitForTrigger(0.05)
+                if delivered is None:
+                    continue
+            else:
+                delivered = self._waitFor(iFrame)
+            if delivered:
+                self._deliver(iFrame)
+                if self._callback is not None:
+                    self._callback(0, pBuffer, iFrame, self._callbackData)
+            iFrame += 1
+
+    # TIS_CAM interface
+
+    def open(self, unique_device_name):
+        self.uniqueName = unique_device_name
+        return 1
+
+    def IsDevValid(self):
+        return 1
+
+    def GetUniqueName(self):
+        return self.uniqueName
+
+    def SaveDeviceStateToFile(self, FileName):
+        state = {'uniqueName': self.uniqueName, 'width': self.width, 'height': self.height,
+                 'frameRate': self.frameRate, 'format': self._format.name,
+                 'properties': [[p, e, v] for (p, e), v in self.properties.items()]}
+        with open(FileName, 'w') as f:
+            json.dump(state, f)
+        return 1
+
+    def LoadDeviceStateFromFileEx(self, FileName, OpenDevice=1):
+        try:
+            with open(FileName) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return 35  # IC_FILE_NOT_FOUND
+        if OpenDevice:
+            self.uniqueName = state['uniqueName']
+        self.width, self.height, self.frameRate = state['width'], state['height'], state['frameRate']
+        self._format = SinkFormats[state['format']]
+        self._buildFrames()
+        self.properties = {}
+        for p, e, v in state['properties']:
+            self.SetPropertySwitch(p, e, v)
+        return 1
+
+    def GetDevices(self):
+        return [self.uniqueName.encode()]
+
+    def SetVideoFormat(self, Format):
+        m = re.search(r'\((\d+)x(\d+)\)', Format)
+        if m is None:
+            return 0
+        self.width, self.height = int(m.group(1)), int(m.group(2))
+        self._buildFrames()
+        return 1
+
+    def GetVideoFormats(self):
+        return [f.encode() for f in _VIDEO_FORMATS]
+
+    def GetAvailableFrameRates(self):
+        return list(_FRAME_RATES)
+
+    def SetFrameRate(self, FPS):
+        self.frameRate = float(FPS)
+        return 1
+
+    def GetFrameRate(self):
+        return self.frameRate
+
+    def SetFormat(self, Format):
+        if self._live:
+            return 0
+        self._format = Format
+        self._setSink()
+        return 1
+
+    def GetFormat(self):
+        return self._format
+
+    def SetFrameReadyCallback(self, CallbackFunction, data):
+        self._callback = CallbackFunction
+        self._callbackData = data
+        return 1
+
+    def SetContinuousMode(self, Mode):
+        self._continuous = bool(Mode)
+        return 1
+
+    def StartLive(self, showlive=1):
+        if self._live:
+            return 1
+        self._rng = np.random.default_rng(self.seed)
+        self._tLive = time.perf_counter()
+        self._nextSnap = 0
+        self._triggers = queue.Queue()
+        self._live = True
+        if not self._continuous:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='SimCam-driver', daemon=True)
+            self._thread.start()
+        return 1
+
+    def StopLive(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._live = False
+        return 1
+
+    def SnapImage(self):
+        if not self._live:
+            return -3  # IC_NOT_IN_LIVEMODE
+        if self._triggered:
+            delivered = False
+            while not delivered:
+                delivered = self._waitForTrigger(2.0)
+                if delivered is None:
+                    return 0  # IC_ERROR: timed out
+                self._nextSnap += 1
+            self._deliver(self._nextSnap - 1)
+            self._notify(self._nextSnap - 1)
+            return 1
+        # the driver hands over the next frame to finish after the call
+        iFrame = max(self._nextSnap,
+                     int((time.perf_counter() - self._tLive - self.latency) * self.frameRate))
+        while not self._waitFor(iFrame):
+            iFrame += 1
+        self._deliver(iFrame)
+        self._notify(iFrame)
+        self._nextSnap = iFrame + 1
+        return 1
+
+    def GetImageDescription(self):
+        return (self.width, self.height, _BITS_PER_PIXEL[self._format], self._format.value)
+
+    def GetImagePtr(self):
+        return self._image.ctypes.data
+
+    def GetImage(self):
+        return self._image
+
+    def GetImageView(self):
+        return self._image
+
+    def GetImageEx(self):
+        if self._format == SinkFormats.Y16:
+            return self._image.view('<u2')
+        return self._image
+
+    def GetImageInto(self, out):
+        if out.nbytes != self._image.nbytes or not out.flags.c_contiguous:
+            raise ValueError('Buffer must be C-contiguous with %d bytes' % self._image.nbytes)
+        C.memmove(out.ctypes.data, self._image.ctypes.data, self._image.nbytes)
+        return out
+
+    def SetPropertyValue(self, Property, Element, Value):
+        self.properties[(Property, Element)] = Value
+        return 1
+
+    def GetPropertyValue(self, Property, Element):
+        return self.properties.get((Property, Element), 0)
+
+    def SetPropertySwitch(self, Property, Element, Value):
+        self.properties[(Property, Element)] = Value
+        if (Property, Element) == ('Trigger', 'Enable'):
+            self._triggered = bool(Value)
+        return 1
+
+    def GetPropertySwitch(self, Property, Element, Value):
+        Value[0] = self.properties.get((Property, Element), 0)
+        return 1
+
+    def SetPropertyAbsoluteValue(self, Property, Element, Value):
+        self.properties[(Property, Element)] = Value
+        return 1
+
+    def GetPropertyAbsoluteValue(self, Property, Element, Value):
+        Value[0] = self.properties.get((Property, Element), 0.)
+        return 1
+
+    def IsPropertyAvailable(self, Property, Element=None):
+        known = set(_VALUE_RANGES) | set(_ABSOLUTE_RANGES) | _SWITCHES
+        return int(any(p == Property and Element in (None, e) for p, e in known))
+
+    def GetPropertyValueRange(self, Property, Element, Range):
+        if (Property, Element) not in _VALUE_RANGES:
+            return -4  # IC_PROPERTY_ITEM_NOT_AVAILABLE
+        Range[0], Range[1] = _VALUE_RANGES[(Property, Element)]
+        return 1
+
+    def GetPropertyAbsoluteValueRange(self, Property, Element, Range):
+        if (Property, Element) not in _ABSOLUTE_RANGES:
+            return -4
+        Range[0], Range[1] = _ABSOLUTE_RANGES[(Property, Element)]
+        return 1
+
+    def PropertyOnePush(self, Property, Element):
+        return 1
+
+
+def openConnected(triggerLine, **kwargs):
+    """ Make a SimCam with its trigger input on a fakeu6.TriggerLine, e.g. in a camera
+    process started by multicam.MultiCamRecorder.
+
+    Args:
+        triggerLine: (fakeu6.TriggerLine) line connected to the fake U6 in the parent
+        **kwargs: SimCam arguments
+
+    Returns:
+        cam: (SimCam) the camera.
+    """
+    cam = SimCam(**kwargs)
+    triggerLine.connect(cam)
+    return cam
@@ -25,11 +25,53 @@ class GrabberHandle(C.Structure):
     pass
 GrabberHandle._fields_ = [('unused', C.c_int)]
 
+_tisgrabber = None
+
+def _library():
+    """ Load the tisgrabber DLL and initialize IC Imaging Control, once, on first use.
+    Nothing is loaded at import, so the module (SinkFormats, callback types) imports
+    quickly, and also on machines without the DLL, e.g. for simulated cameras.
+    """
+    global _tisgrabber
+    if _tisgrabber is None:
+        if not hasattr(C, 'windll'):
+            raise OSError('The tisgrabber DLL is only available on Windows')
+        if sys.maxsize > 2**32 :
+            lib = C.windll.LoadLibrary("tisgrabber_x64.dll")
+        else:
+            lib = C.windll.LoadLibrary("tisgrabber.dll")
+#     Initialize the ICImagingControl class library. This function must be called
+#	only once before any other functions of this library are called.
+#	@param szLicenseKey IC Imaging Control license key or NULL if only a trial version is available.
+#	@retval IC_SUCCESS on success.
+#	@retval IC_ERROR on wrong license key or other errors.
+#	@sa IC_CloseLibrary
+        TIS_GrabberDLL.InitLibrary = lib.IC_InitLibrary(None)
+        _tisgrabber = lib
+    return _tisgrabber
+
+class _Prototype(object):
+    """ A DLL function whose prototype is bound on first access.
+    The first lookup replaces this descriptor on the class with the ctypes function,
+    so later calls cost nothing extra.
+    """
+    def __init__(self, cname, restype=C.c_int, argtypes=None):
+        self.cname = cname
+        self.restype = restype
+        self.argtypes = argtypes
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        fn = getattr(_library(), self.cname)
+        fn.restype = self.restype
+        if self.argtypes is not None:
+            fn.argtypes = self.argtypes
+        setattr(owner, self.name, fn)
+        return fn
+
 class TIS_GrabberDLL(object):
-    if sys.maxsize > 2**32 :
-        __tisgrabber = C.windll.LoadLibrary("tisgrabber_x64.dll")
-    else:
-        __tisgrabber = C.windll.LoadLibrary("tisgrabber.dll")
     
     def __init__(self, **keyargs):
         """Initialize the Albatross from the keyword arguments."""
@@ -38,14 +80,6 @@ class TIS_GrabberDLL(object):
 
     GrabberHandlePtr = C.POINTER(GrabberHandle)
     
-#     Initialize the ICImagingControl class library. This function must be called
-#	only once before any other functions of this library are called.
-#	@param szLicenseKey IC Imaging Control license key or NULL if only a trial version is available.
-#	@retval IC_SUCCESS on success.
-#	@retval IC_ERROR on wrong license key or other errors.
-#	@sa IC_CloseLibrary
-    InitLibrary = __tisgrabber.IC_InitLibrary(None)
-    
 #     Get the number of the currently available devices. This function creates an
 #	internal array of all connected video capture devices. With each call to this 
 #	function, this array is rebuild. The name and the unique name can be retrieved 
@@ -57,9 +91,7 @@ class TIS_GrabberDLL(object):
 #
 #	@sa IC_GetDevice
 #	@sa IC_GetUniqueNamefromList
-    get_devicecount =  __tisgrabber.IC_GetDeviceCount
-    get_devicecount.restype = C.c_int
-    get_devicecount.argtypes = None
+    get_devicecount = _Prototype('IC_GetDeviceCount', C.c_int)
     
 #     Get unique device name of a device specified by iIndex. The unique device name
 #	consist from the device name and its serial number. It allows to differ between 
@@ -75,16 +107,12 @@ class TIS_GrabberDLL(object):
 #	@sa IC_GetUniqueNamefromList
 #	@sa IC_OpenDevByUniqueName
 
-    get_unique_name_from_list = __tisgrabber.IC_GetUniqueNamefromList
-    get_unique_name_from_list.restype = C.c_char_p
-    get_unique_name_from_list.argtypes = (C.c_int,)
+    get_unique_name_from_list = _Prototype('IC_GetUniqueNamefromList', C.c_char_p, (C.c_int,))
     
 #     Creates a new grabber handle and returns it. A new created grabber should be
 #	release with a call to IC_ReleaseGrabber if it is no longer needed.
 #	@sa IC_ReleaseGrabber
-    create_grabber = __tisgrabber.IC_CreateGrabber
-    create_grabber.restype = GrabberHandlePtr
-    create_grabber.argtypes = None
+    create_grabber = _Prototype('IC_CreateGrabber', GrabberHandlePtr)
 
 #    Open a video capture by using its UniqueName. Use IC_GetUniqueName() to
 #    retrieve the unique name of a camera.
@@ -94,32 +122,23 @@ class TIS_GrabberDLL(object):
 #
 #	@sa IC_GetUniqueName
 #	@sa IC_ReleaseGrabber
-    open_device_by_unique_name = __tisgrabber.IC_OpenDevByUniqueName
-    open_device_by_unique_name.restype = C.c_int
-    open_device_by_unique_name.argtypes = (GrabberHandlePtr,
-                                           C.c_char_p)   
+    open_device_by_unique_name = _Prototype('IC_OpenDevByUniqueName', C.c_int,
+                                            (GrabberHandlePtr,
+                                             C.c_char_p))
                                            
 
-    set_videoformat = __tisgrabber.IC_SetVideoFormat
-    set_videoformat.restype = C.c_int
-    set_videoformat.argtypes = (GrabberHandlePtr,
-                                           C.c_char_p)   
+    set_videoformat = _Prototype('IC_SetVideoFormat', C.c_int, (GrabberHandlePtr, C.c_char_p))
 
-    set_framerate = __tisgrabber.IC_SetFrameRate
-    set_framerate.restype = C.c_int
-    set_framerate.argtypes = (GrabberHandlePtr,
-                                           C.c_float)   
+    set_framerate = _Prototype('IC_SetFrameRate', C.c_int, (GrabberHandlePtr, C.c_float))
+
+    get_framerate = _Prototype('IC_GetFrameRate', C.c_float, (GrabberHandlePtr,))
                                           
                                           
 #    Returns the width of the video format.                                          
-    get_video_format_width = __tisgrabber.IC_GetVideoFormatWidth
-    get_video_format_width.restype = C.c_int
-    get_video_format_width.argtypes = (GrabberHandlePtr,)                                          
+    get_video_format_width = _Prototype('IC_GetVideoFormatWidth', C.c_int, (GrabberHandlePtr,))
     
 #    returns the height of the video format.
-    get_video_format_height = __tisgrabber.IC_GetVideoFormatHeight
-    get_video_format_height.restype = C.c_int
-    get_video_format_height.argtypes = (GrabberHandlePtr,)                            
+    get_video_format_height = _Prototype('IC_GetVideoFormatHeight', C.c_int, (GrabberHandlePtr,))
     
     
 #    Get the number of the available video formats for the current device. 
@@ -132,9 +151,7 @@ class TIS_GrabberDLL(object):
 #	@retval IC_NO_HANDLE No handle to the grabber object.
 #
 #	@sa IC_GetVideoFormat
-    GetVideoFormatCount = __tisgrabber.IC_GetVideoFormatCount
-    GetVideoFormatCount.restype = C.c_int
-    GetVideoFormatCount.argtypes = (GrabberHandlePtr,)
+    GetVideoFormatCount = _Prototype('IC_GetVideoFormatCount', C.c_int, (GrabberHandlePtr,))
 
 #     Get a string representation of the video format specified by iIndex. 
 #	iIndex must be between 0 and IC_GetVideoFormatCount().
@@ -147,10 +164,7 @@ class TIS_GrabberDLL(object):
 #	@retval Nonnull The name of the specified video format.
 #	@retval NULL An error occured.
 #	@sa IC_GetVideoFormatCount
-    GetVideoFormat = __tisgrabber.IC_GetVideoFormat
-    GetVideoFormat.restype = C.c_char_p
-    GetVideoFormat.argtypes = (GrabberHandlePtr,
-                               C.c_int,) 
+    GetVideoFormat = _Prototype('IC_GetVideoFormat', C.c_char_p, (GrabberHandlePtr, C.c_int))
 
 #    Get the number of the available input channels for the current device.
 #    A video	capture device must have been opened before this call.
@@ -162,9 +176,7 @@ class TIS_GrabberDLL(object):
 #	@retval IC_NO_HANDLE No handle to the grabber object.
 #
 #	@sa IC_GetInputChannel                               
-    GetInputChannelCount = __tisgrabber.IC_GetInputChannelCount
-    GetInputChannelCount.restype = C.c_int
-    GetInputChannelCount.argtypes = (GrabberHandlePtr,)
+    GetInputChannelCount = _Prototype('IC_GetInputChannelCount', C.c_int, (GrabberHandlePtr,))
     
 #     Get a string representation of the input channel specified by iIndex. 
 #	iIndex must be between 0 and IC_GetInputChannelCount().
@@ -176,10 +188,7 @@ class TIS_GrabberDLL(object):
 #	@retval Nonnull The name of the specified input channel
 #	@retval NULL An error occured.
 #	@sa IC_GetInputChannelCount
-    GetInputChannel = __tisgrabber.IC_GetInputChannel
-    GetInputChannel.restype = C.c_char_p
-    GetInputChannel.argtypes = (GrabberHandlePtr,
-                               C.c_int,)     
+    GetInputChannel = _Prototype('IC_GetInputChannel', C.c_char_p, (GrabberHandlePtr, C.c_int))
     
     
 #     Get the number of the available video norms for the current device. 
@@ -192,9 +201,7 @@ class TIS_GrabberDLL(object):
 #	@retval IC_NO_HANDLE No handle to the grabber object.
 #	
 #	@sa IC_GetVideoNorm
-    GetVideoNormCount = __tisgrabber.IC_GetVideoNormCount
-    GetVideoNormCount.restype = C.c_int
-    GetVideoNormCount.argtypes = (GrabberHandlePtr,)
+    GetVideoNormCount = _Prototype('IC_GetVideoNormCount', C.c_int, (GrabberHandlePtr,))
     
     
 #     Get a string representation of the video norm specified by iIndex. 
@@ -208,19 +215,11 @@ class TIS_GrabberDLL(object):
 #	@retval Nonnull The name of the specified video norm.
 #	@retval NULL An error occured.
 #	@sa IC_GetVideoNormCount
-    GetVideoNorm = __tisgrabber.IC_GetVideoNorm
-    GetVideoNorm.restype = C.c_char_p
-    GetVideoNorm.argtypes = (GrabberHandlePtr,
-                               C.c_int,)  
+    GetVideoNorm = _Prototype('IC_GetVideoNorm', C.c_char_p, (GrabberHandlePtr, C.c_int))
 
 
-    SetFormat = __tisgrabber.IC_SetFormat
-    SetFormat.restype = C.c_int
-    SetFormat.argtypes = (GrabberHandlePtr,
-                               C.c_int,)  
-    GetFormat = __tisgrabber.IC_GetFormat
-    GetFormat.restype = C.c_int
-    GetFormat.argtypes = (GrabberHandlePtr,)  
+    SetFormat = _Prototype('IC_SetFormat', C.c_int, (GrabberHandlePtr, C.c_int))
+    GetFormat = _Prototype('IC_GetFormat', C.c_int, (GrabberHandlePtr,))
 
 
 #    Start the live video. 
@@ -230,20 +229,12 @@ class TIS_GrabberDLL(object):
 #	@retval IC_ERROR if something went wrong.
 #	@sa IC_StopLive
 
-    StartLive = __tisgrabber.IC_StartLive
-    StartLive.restype = C.c_int
-    StartLive.argtypes = (GrabberHandlePtr,
-                               C.c_int,) 
+    StartLive = _Prototype('IC_StartLive', C.c_int, (GrabberHandlePtr, C.c_int))
 
-    StopLive = __tisgrabber.IC_StopLive
-    StopLive.restype = C.c_int
-    StopLive.argtypes = (GrabberHandlePtr,) 
+    StopLive = _Prototype('IC_StopLive', C.c_int, (GrabberHandlePtr,))
 
 
-    SetHWND = __tisgrabber.IC_SetHWnd
-    SetHWND.restype = C.c_int
-    SetHWND.argtypes = (GrabberHandlePtr,
-                               C.c_int,) 
+    SetHWND = _Prototype('IC_SetHWnd', C.c_int, (GrabberHandlePtr, C.c_int))
 
 
 #    Snaps an image. The video capture device must be set to live mode and a 
@@ -262,10 +253,7 @@ class TIS_GrabberDLL(object):
 #	@sa IC_StartLive 
 #	@sa IC_SetFormat
     
-    SnapImage=__tisgrabber.IC_SnapImage
-    SnapImage.restype = C.c_int
-    SnapImage.argtypes = (GrabberHandlePtr,
-                               C.c_int,) 
+    SnapImage = _Prototype('IC_SnapImage', C.c_int, (GrabberHandlePtr, C.c_int))
  
  
 #    Retrieve the properties of the current video format and sink type 
@@ -277,139 +265,151 @@ class TIS_GrabberDLL(object):
 #	@retval IC_SUCCESS on success
 #	@retval IC_ERROR if something went wrong.
                            
-    GetImageDescription = __tisgrabber.IC_GetImageDescription
-    GetImageDescription.restype = C.c_int     
-    GetImageDescription.argtypes = (GrabberHandlePtr,
-                                    C.POINTER(C.c_long),
-                                    C.POINTER(C.c_long),
-                                    C.POINTER(C.c_int),
-                                    C.POINTER(C.c_int),)
+    GetImageDescription = _Prototype('IC_GetImageDescription', C.c_int,
+                                     (GrabberHandlePtr,
+                                      C.POINTER(C.c_long),
+                                      C.POINTER(C.c_long),
+                                      C.POINTER(C.c_int),
+                                      C.POINTER(C.c_int)))
                       
      
      
 
-    GetImagePtr = __tisgrabber.IC_GetImagePtr
-    GetImagePtr.restype = C.c_void_p
-    GetImagePtr.argtypes = (GrabberHandlePtr,) 
+    GetImagePtr = _Prototype('IC_GetImagePtr', C.c_void_p, (GrabberHandlePtr,))
     
     
 # ############################################################################
-    ShowDeviceSelectionDialog = __tisgrabber.IC_ShowDeviceSelectionDialog
-    ShowDeviceSelectionDialog.restype = GrabberHandlePtr
-    ShowDeviceSelectionDialog.argtypes = (GrabberHandlePtr,)
+    ShowDeviceSelectionDialog = _Prototype('IC_ShowDeviceSelectionDialog', GrabberHandlePtr,
+                                           (GrabberHandlePtr,))
 
 # ############################################################################
     
-    ShowPropertyDialog = __tisgrabber.IC_ShowPropertyDialog
-    ShowPropertyDialog.restype = GrabberHandlePtr
-    ShowPropertyDialog.argtypes = (GrabberHandlePtr,)
+    ShowPropertyDialog = _Prototype('IC_ShowPropertyDialog', GrabberHandlePtr, (GrabberHandlePtr,))
     
 # ############################################################################
-    IsDevValid = __tisgrabber.IC_IsDevValid
-    IsDevValid.restype = C.c_int     
-    IsDevValid.argtypes = (GrabberHandlePtr,)
+    IsDevValid = _Prototype('IC_IsDevValid', C.c_int, (GrabberHandlePtr,))
 
 # ############################################################################
 
-    LoadDeviceStateFromFile = __tisgrabber.IC_LoadDeviceStateFromFile
-    LoadDeviceStateFromFile.restype = GrabberHandlePtr     
-    LoadDeviceStateFromFile.argtypes = (GrabberHandlePtr,C.c_char_p)
+    LoadDeviceStateFromFile = _Prototype('IC_LoadDeviceStateFromFile', GrabberHandlePtr,
+                                         (GrabberHandlePtr,
+                                          C.c_char_p))
     
 # ############################################################################
-    SaveDeviceStateToFile = __tisgrabber.IC_SaveDeviceStateToFile
-    SaveDeviceStateToFile.restype = C.c_int     
-    SaveDeviceStateToFile.argtypes = (GrabberHandlePtr,C.c_char_p)
+    LoadDeviceStateFromFileEx = _Prototype('IC_LoadDeviceStateFromFileEx', C.c_int,
+                                           (GrabberHandlePtr,
+                                            C.c_char_p,
+                                            C.c_int))
+
+# ############################################################################
+    GetUniqueName = _Prototype('IC_GetUniqueName', C.c_int,
+                               (GrabberHandlePtr,
+                                C.c_char_p,
+                                C.c_int))
+
+# ############################################################################
+    SaveDeviceStateToFile = _Prototype('IC_SaveDeviceStateToFile', C.c_int,
+                                       (GrabberHandlePtr,
+                                        C.c_char_p))
     
     
-    GetCameraProperty = __tisgrabber.IC_GetCameraProperty
-    GetCameraProperty.restype = C.c_int
-    GetCameraProperty.argtypes = (GrabberHandlePtr,
-                                                 C.c_int,
-                                                 C.POINTER(C.c_long),)
+    GetCameraProperty = _Prototype('IC_GetCameraProperty', C.c_int,
+                                   (GrabberHandlePtr,
+                                    C.c_int,
+                                    C.POINTER(C.c_long)))
 
-    SetCameraProperty = __tisgrabber.IC_SetCameraProperty
-    SetCameraProperty.restype = C.c_int
-    SetCameraProperty.argtypes = (GrabberHandlePtr,
-                                                 C.c_int,
-                                                 C.c_long,)
+    SetCameraProperty = _Prototype('IC_SetCameraProperty', C.c_int,
+                                   (GrabberHandlePtr,
+                                    C.c_int,
+                                    C.c_long))
 
 
-    SetPropertyValue = __tisgrabber.IC_SetPropertyValue
-    SetPropertyValue.restype = C.c_int
-    SetPropertyValue.argtypes = (GrabberHandlePtr,
-                            C.c_char_p,
-                            C.c_char_p,
-                            C.c_int, )
+    SetPropertyValue = _Prototype('IC_SetPropertyValue', C.c_int,
+                                  (GrabberHandlePtr,
+                                   C.c_char_p,
+                                   C.c_char_p,
+                                   C.c_int))
 
 
-    GetPropertyValue = __tisgrabber.IC_GetPropertyValue
-    GetPropertyValue.restype = C.c_int
-    GetPropertyValue.argtypes = (GrabberHandlePtr,
-                            C.c_char_p,
-                            C.c_char_p,
-                            C.POINTER(C.c_long), )
+    GetPropertyValue = _Prototype('IC_GetPropertyValue', C.c_int,
+                                  (GrabberHandlePtr,
+                                   C.c_char_p,
+                                   C.c_char_p,
+                                   C.POINTER(C.c_long)))
 
 
 # ############################################################################
-    SetPropertySwitch = __tisgrabber.IC_SetPropertySwitch
-    SetPropertySwitch.restype = C.c_int
-    SetPropertySwitch.argtypes= (GrabberHandlePtr,
-                                 C.c_char_p,
-                                 C.c_char_p,
-                                  C.c_int,)
-
-    GetPropertySwitch = __tisgrabber.IC_GetPropertySwitch
-    GetPropertySwitch.restype = C.c_int
-    GetPropertySwitch.argtypes= (GrabberHandlePtr,
-                                 C.c_char_p,
-                                 C.c_char_p,
-                                 C.POINTER(C.c_long),)
+    SetPropertySwitch = _Prototype('IC_SetPropertySwitch', C.c_int,
+                                   (GrabberHandlePtr,
+                                    C.c_char_p,
+                                    C.c_char_p,
+                                    C.c_int))
+
+    GetPropertySwitch = _Prototype('IC_GetPropertySwitch', C.c_int,
+                                   (GrabberHandlePtr,
+                                    C.c_char_p,
+                                    C.c_char_p,
+                                    C.POINTER(C.c_long)))
 # ############################################################################
 
-    IsPropertyAvailable =  __tisgrabber.IC_IsPropertyAvailable
-    IsPropertyAvailable.restype =  C.c_int
-    IsPropertyAvailable.argtypes=  (GrabberHandlePtr,
-                                 C.c_char_p,
-                                 C.c_char_p,)
-
-    PropertyOnePush = __tisgrabber.IC_PropertyOnePush
-    PropertyOnePush.restype = C.c_int
-    PropertyOnePush.argtypes = (GrabberHandlePtr,
-                            C.c_char_p,
-                            C.c_char_p, )
-
-
-    SetPropertyAbsoluteValue = __tisgrabber.IC_SetPropertyAbsoluteValue
-    SetPropertyAbsoluteValue.restype = C.c_int
-    SetPropertyAbsoluteValue.argtypes = (GrabberHandlePtr,
-                            C.c_char_p,
-                            C.c_char_p,
-                            C.c_float, )
-
-    GetPropertyAbsoluteValue = __tisgrabber.IC_GetPropertyAbsoluteValue
-    GetPropertyAbsoluteValue.restype = C.c_int
-    GetPropertyAbsoluteValue.argtypes = (GrabberHandlePtr,
-                            C.c_char_p,
-                            C.c_char_p,
-                            C.POINTER(C.c_float), )
+    IsPropertyAvailable = _Prototype('IC_IsPropertyAvailable', C.c_int,
+                                     (GrabberHandlePtr,
+                                      C.c_char_p,
+                                      C.c_char_p))
+
+    GetPropertyValueRange = _Prototype('IC_GetPropertyValueRange', C.c_int,
+                                       (GrabberHandlePtr,
+                                        C.c_char_p,
+                                        C.c_char_p,
+                                        C.POINTER(C.c_int),
+                                        C.POINTER(C.c_int)))
+
+    GetPropertyAbsoluteValueRange = _Prototype('IC_GetPropertyAbsoluteValueRange', C.c_int,
+                                               (GrabberHandlePtr,
+                                                C.c_char_p,
+                                                C.c_char_p,
+                                                C.POINTER(C.c_float),
+                                                C.POINTER(C.c_float)))
+
+    GetAvailableFrameRates = _Prototype('IC_GetAvailableFrameRates', C.c_int,
+                                        (GrabberHandlePtr,
+                                         C.c_int,
+                                         C.POINTER(C.c_float)))
+
+    PropertyOnePush = _Prototype('IC_PropertyOnePush', C.c_int,
+                                 (GrabberHandlePtr,
+                                  C.c_char_p,
+                                  C.c_char_p))
+
+
+    SetPropertyAbsoluteValue = _Prototype('IC_SetPropertyAbsoluteValue', C.c_int,
+                                          (GrabberHandlePtr,
+                                           C.c_char_p,
+                                           C.c_char_p,
+                                           C.c_float))
+
+    GetPropertyAbsoluteValue = _Prototype('IC_GetPropertyAbsoluteValue', C.c_int,
+                                          (GrabberHandlePtr,
+                                           C.c_char_p,
+                                           C.c_char_p,
+                                           C.POINTER(C.c_float)))
 
     # definition of the frameready callback
     FRAMEREADYCALLBACK = C.CFUNCTYPE(C.c_void_p,C.c_int, C.POINTER(C.c_ubyte), C.c_ulong,  C.py_object )
 
     # set callback function
-    SetFrameReadyCallback = __tisgrabber.IC_SetFrameReadyCallback
-    SetFrameReadyCallback.restype = C.c_int
-    SetFrameReadyCallback.argtypes = [GrabberHandlePtr, FRAMEREADYCALLBACK, C.py_object]
+    SetFrameReadyCallback = _Prototype('IC_SetFrameReadyCallback', C.c_int,
+                                       [GrabberHandlePtr,
+                                        FRAMEREADYCALLBACK,
+                                        C.py_object])
 
-    SetContinuousMode = __tisgrabber.IC_SetContinuousMode
+    SetContinuousMode = _Prototype('IC_SetContinuousMode')
 
-    SaveImage = __tisgrabber.IC_SaveImage
-    SaveImage.restype = C.c_int
-    SaveImage.argtypes = [C.c_void_p, C.c_char_p, C.c_int, C.c_int ]
+    SaveImage = _Prototype('IC_SaveImage', C.c_int, [C.c_void_p, C.c_char_p, C.c_int, C.c_int])
 
-    OpenVideoCaptureDevice = __tisgrabber.IC_OpenVideoCaptureDevice
-    OpenVideoCaptureDevice.restype = C.c_int
-    OpenVideoCaptureDevice.argtypes = [C.c_void_p, C.c_char_p]
+    OpenVideoCaptureDevice = _Prototype('IC_OpenVideoCaptureDevice', C.c_int,
+                                        [C.c_void_p,
+                                         C.c_char_p])
 
 # ############################################################################
 
@@ -426,6 +426,7 @@ class TIS_CAM(object):
             self._callback_registered = False
             self._frame = {'num'    :   -1,
                            'ready'  :   False}    
+            self._ResetImageGeometry()
                                   
         def s(self,strin):
             if sys.version[0] == "2":
@@ -457,15 +458,18 @@ class TIS_CAM(object):
             
             unique_device_name : The name and serial number of the device to be opened. The device name and serial number are separated by a space.
             """
+            self._ResetImageGeometry()
             test = TIS_GrabberDLL.open_device_by_unique_name(self._handle,
                                                        self.s(unique_device_name))
 
             return test                                           
 
         def ShowDeviceSelectionDialog(self):
+            self._ResetImageGeometry()
             self._handle = TIS_GrabberDLL.ShowDeviceSelectionDialog(self._handle)
             
         def ShowPropertyDialog(self):
+            self._ResetImageGeometry()
             self._handle = TIS_GrabberDLL.ShowPropertyDialog(self._handle)
             
         def IsDevValid(self):
@@ -478,14 +482,36 @@ class TIS_CAM(object):
             return TIS_GrabberDLL.SaveDeviceStateToFile(self._handle, self.s(FileName))
             
         def LoadDeviceStateFromFile(self,FileName):
+            self._ResetImageGeometry()
             self._handle = TIS_GrabberDLL.LoadDeviceStateFromFile(self._handle,self.s(FileName))
+
+        def LoadDeviceStateFromFileEx(self, FileName, OpenDevice=1):
+            """ Load a device settings file into this grabber.
+
+            OpenDevice : 1 to open the device named in the file, 0 to apply the file to the open device.
+            :returns: 1 on success, IC_NOT_ALL_PROPERTIES_RESTORED (-4) if the device was opened
+                      but not all properties could be set, other values <= 0 on failure.
+            """
+            self._ResetImageGeometry()
+            return TIS_GrabberDLL.LoadDeviceStateFromFileEx(self._handle, self.s(FileName), OpenDevice)
+
+        def GetUniqueName(self):
+            """ Unique name (model and serial number) of the open device, or None. """
+            Name = C.create_string_buffer(256)
+            if TIS_GrabberDLL.GetUniqueName(self._handle, Name, len(Name)) != 1:
+                return None
+            return Name.value.decode("utf-8")
             
 
         def SetVideoFormat(self,Format):
+            self._ResetImageGeometry()
             return TIS_GrabberDLL.set_videoformat(self._handle, self.s(Format))
 
         def SetFrameRate(self,FPS):
             return TIS_GrabberDLL.set_framerate(self._handle, FPS)
+
+        def GetFrameRate(self):
+            return TIS_GrabberDLL.get_framerate(self._handle)
         
         def get_video_format_width(self):
             return TIS_GrabberDLL.get_video_format_width(self._handle)
@@ -510,26 +536,36 @@ class TIS_CAM(object):
             return self._Properties
 
         def GetInputChannels(self):
-            self.InputChannels=[] 
+            self._InputChannels=[]
             InputChannelscount = TIS_GrabberDLL.GetInputChannelCount(self._handle)
             for i in range (InputChannelscount):
-                self.InputChannels.append(TIS_GrabberDLL.GetInputChannel(self._handle,i))
-            return self.InputChannels
+                self._InputChannels.append(TIS_GrabberDLL.GetInputChannel(self._handle,i))
+            return self._InputChannels
 
         def GetVideoNormCount(self):
-            self.GetVideoNorm=[]
+            self._VideoNorms=[]
             GetVideoNorm_Count=TIS_GrabberDLL.GetVideoNormCount(self._handle)
             for i in range(GetVideoNorm_Count):
-                self.GetVideoNorm.append(TIS_GrabberDLL.GetVideoNorm(self._handle, i))
-            return self.GetVideoNorm
+                self._VideoNorms.append(TIS_GrabberDLL.GetVideoNorm(self._handle, i))
+            return self._VideoNorms
+
+        def GetAvailableFrameRates(self):
+            """ Frame rates available in the current video format. """
+            fps = C.c_float()
+            FrameRates = []
+            while TIS_GrabberDLL.GetAvailableFrameRates(self._handle, len(FrameRates), fps) == 1:
+                FrameRates.append(fps.value)
+            return FrameRates
         
 
         def SetFormat(self, Format):
             ''' SetFormat 
             Sets the pixel format in memory
             @param Format Sinkformat enumeration
+            @return IC_SUCCESS on success
             '''
-            TIS_GrabberDLL.SetFormat(self._handle, Format.value)
+            self._ResetImageGeometry()
+            return TIS_GrabberDLL.SetFormat(self._handle, Format.value)
 
         def GetFormat(self):
             val = TIS_GrabberDLL.GetFormat(self._handle)
@@ -552,6 +588,7 @@ class TIS_CAM(object):
 
             showlive: 1 : a live video is shown, 0 : the live video is not shown.
             """
+            self._ResetImageGeometry()
             Error = TIS_GrabberDLL.StartLive(self._handle, showlive)
             return Error
 
@@ -583,50 +620,63 @@ class TIS_CAM(object):
             
             return ImagePtr
            
-        def GetImage(self):
-            BildDaten = self.GetImageDescription()[:4]
-            lWidth=BildDaten[0]
-            lHeight= BildDaten[1]
-            iBitsPerPixel=BildDaten[2]//8
+        def _ResetImageGeometry(self):
+            """ Forget the cached image geometry; called whenever the format may change. """
+            self._geometry = None
+            self._viewPtr = None
+            self._view = None
+
+        def GetImageGeometry(self):
+            """ (width, height, bytes per pixel, color format, ctypes array type of one image).
+            Read once with GetImageDescription and cached until the format changes.
+            """
+            if self._geometry is None:
+                lWidth, lHeight, iBitsPerPixel, COLORFORMAT = self.GetImageDescription()
+                iBytesPerPixel = iBitsPerPixel // 8
+                self._geometry = (lWidth, lHeight, iBytesPerPixel, COLORFORMAT,
+                                  C.c_ubyte * (lWidth * lHeight * iBytesPerPixel))
+            return self._geometry
+
+        def GetImageView(self):
+            """ Borrowed view of the driver's image buffer, (height, width, bytes per pixel) uint8.
+            No copy is made: the data is only valid until the next SnapImage, and must be
+            copied (e.g. with GetImageInto) to be kept.
+            """
+            img_ptr = TIS_GrabberDLL.GetImagePtr(self._handle)
+            if img_ptr is None:
+                raise RuntimeError('No image in the driver buffer')
+            if img_ptr != self._viewPtr:
+                lWidth, lHeight, iBytesPerPixel, _, ArrayType = self.GetImageGeometry()
+                self._view = np.frombuffer(ArrayType.from_address(img_ptr), dtype=np.uint8).reshape(
+                    lHeight, lWidth, iBytesPerPixel)
+                self._viewPtr = img_ptr
+            return self._view
+
+        def GetImageInto(self, out):
+            """ Copy the last image into a preallocated C-contiguous array with the same
+            number of bytes, e.g. shaped (height, width, bytes per pixel) uint8. One memcpy.
+            """
+            nBytes = C.sizeof(self.GetImageGeometry()[4])
+            if out.nbytes != nBytes or not out.flags.c_contiguous:
+                raise ValueError('Buffer must be C-contiguous with %d bytes' % nBytes)
+            img_ptr = TIS_GrabberDLL.GetImagePtr(self._handle)
+            if img_ptr is None:
+                raise RuntimeError('No image in the driver buffer')
+            C.memmove(out.ctypes.data, img_ptr, nBytes)
+            return out
 
-            buffer_size = lWidth*lHeight*iBitsPerPixel*C.sizeof(C.c_uint8)            
-            img_ptr = self.GetImagePtr()
-            
-            Bild = C.cast(img_ptr, C.POINTER(C.c_ubyte * buffer_size))
-            
-            
-            img = np.ndarray(buffer = Bild.contents,
-                         dtype = np.uint8,
-                         shape = (lHeight,
-                                  lWidth,
-                                  iBitsPerPixel))
-            return img
+        def GetImage(self):
+            """ Borrowed view of the last image, see GetImageView. """
+            return self.GetImageView()
 
         def GetImageEx(self):
-            """ Return a numpy array with the image data tyes
-            If the sink is Y16 or RGB64 (not supported yet), the dtype in the array is uint16, othereise it is uint8
+            """ Borrowed view of the last image with the sink's pixel type, see GetImageView.
+            For a Y16 sink this is (height, width, 1) uint16, otherwise (height, width,
+            bytes per pixel) uint8. RGB64 is not supported yet.
             """
-            BildDaten = self.GetImageDescription()[:4]
-            lWidth=BildDaten[0]
-            lHeight= BildDaten[1]
-            iBytesPerPixel=BildDaten[2]//8
-
-            buffer_size = lWidth*lHeight*iBytesPerPixel*C.sizeof(C.c_uint8)            
-            img_ptr = self.GetImagePtr()
-            
-            Bild = C.cast(img_ptr, C.POINTER(C.c_ubyte * buffer_size))
-            
-            pixeltype = np.uint8
-
-            if  BildDaten[3] == 4: #SinkFormats.Y16:
-                pixeltype = np.uint16
-                iBytesPerPixel = 1
-            
-            img = np.ndarray(buffer = Bild.contents,
-                         dtype = pixeltype,
-                         shape = (lHeight,
-                                  lWidth,
-                                  iBytesPerPixel))
+            img = self.GetImageView()
+            if self._geometry[3] == SinkFormats.Y16.value:
+                return img.view(np.uint16)
             return img
 
 
@@ -665,6 +715,29 @@ class TIS_CAM(object):
             return error    
             
 
+        def IsPropertyAvailable(self, Property, Element=None):
+            """ 1 if the property (and element, if given) exists on the open device. """
+            return TIS_GrabberDLL.IsPropertyAvailable(self._handle, self.s(Property),
+                                                      self.s(Element) if Element is not None else None)
+
+        def GetPropertyValueRange(self, Property, Element, Range):
+            """ Range[0], Range[1] receive the minimum and maximum of a value property. """
+            lMin = C.c_int()
+            lMax = C.c_int()
+            error = TIS_GrabberDLL.GetPropertyValueRange(self._handle, self.s(Property),
+                                                         self.s(Element), lMin, lMax)
+            Range[0], Range[1] = lMin.value, lMax.value
+            return error
+
+        def GetPropertyAbsoluteValueRange(self, Property, Element, Range):
+            """ Range[0], Range[1] receive the minimum and maximum of an absolute value property. """
+            fMin = C.c_float()
+            fMax = C.c_float()
+            error = TIS_GrabberDLL.GetPropertyAbsoluteValueRange(self._handle, self.s(Property),
+                                                                 self.s(Element), fMin, fMax)
+            Range[0], Range[1] = fMin.value, fMax.value
+            return error
+
         def SetPropertySwitch(self, Property, Element, Value):
             error = TIS_GrabberDLL.SetPropertySwitch(self._handle, 
                                                       self.s(Property), 